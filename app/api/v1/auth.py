@@ -1,39 +1,62 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status
 from pydantic import BaseModel
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
-from passlib.hash import bcrypt
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app.db.session import get_session_sync
+from app.core.security import (
+    HashingBusy,
+    create_access_token,
+    hash_password,
+    verify_password,
+)
+from app.db.session import get_async_session
 from app.db.models import User
 
 import uuid
 
 router = APIRouter()
 
+def _busy():
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts in progress, try again shortly",
+        headers={"Retry-After": "1"}
+    )
+
 class RegisterIn(BaseModel):
     email: str
     password: str
 
 @router.post("/register")
-def register(payload: RegisterIn):
-    with get_session_sync() as session:
-        stmt = select(User).where(User.email == payload.email)
-        existing = session.exec(stmt).one_or_none()
-
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already registered")
-
-        hashed = bcrypt.hash(payload.password)
-        new_user = User(
-            id=str(uuid.uuid4()),
-            email=payload.email,
-            password_hash=hashed
-        )
+async def register(payload: RegisterIn, session: AsyncSession = Depends(get_async_session)):
+    stmt = select(User.id).where(User.email == payload.email)
+    existing = (await session.exec(stmt)).first()
+
+    if existing:
+        raise HTTPException(status_code=400, detail="Email already registered")
+
+    # bcrypt runs on the bounded hashing pool, not the event loop
+    try:
+        hashed = await hash_password(payload.password)
+    except HashingBusy:
+        raise _busy()
+
+    new_user = User(
+        id=str(uuid.uuid4()),
+        email=payload.email,
+        password_hash=hashed
+    )
 
-        session.add(new_user)
-        session.commit()
+    session.add(new_user)
+    try:
+        await session.commit()
+    except IntegrityError:
+        # Registered concurrently (unique index on email)
+        await session.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
 
-        return {"message": "User registered successfully", "user_id": new_user.id}
+    return {"message": "User registered successfully", "user_id": new_user.id}
 
 
 class LoginIn(BaseModel):
@@ -41,15 +64,27 @@ class LoginIn(BaseModel):
     password: str
 
 @router.post("/login")
-def login(payload: LoginIn):
-    with get_session_sync() as session:
-        stmt = select(User).where(User.email == payload.email)
-        user = session.exec(stmt).one_or_none()
-
-        if not user or not bcrypt.verify(payload.password, user.password_hash):
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid email or password"
-            )
-
-        return {"message": "Login successful", "user_id": user.id}
+async def login(payload: LoginIn, session: AsyncSession = Depends(get_async_session)):
+    stmt = select(User.id, User.password_hash).where(User.email == payload.email)
+    user = (await session.exec(stmt)).first()
+
+    # Unknown emails still pay for a (dummy) bcrypt verify: same timing
+    try:
+        valid = await verify_password(payload.password, user.password_hash if user else None)
+    except HashingBusy:
+        raise _busy()
+
+    if not user or not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid email or password"
+        )
+
+    token, expires_in = create_access_token(user.id)
+    return {
+        "message": "Login successful",
+        "user_id": user.id,
+        "access_token": token,
+        "token_type": "bearer",
+        "expires_in": expires_in
+    }
@@ -1,26 +1,196 @@
-from fastapi import APIRouter, HTTPException
-from app.db.session import get_session_sync
-from app.db.models import Recommendation
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, WebSocket
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.core.security import current_user_id, current_user_id_or_query, websocket_user_id
+from app.db.session import async_session_factory
+from app.db.models import Image, Recommendation
+from app.services import results
+from app.services.events import hub
 from sqlmodel import select
 
 router = APIRouter()
 
-@router.get("/{image_id}")
-def get_recommendation(image_id: str):
-    with get_session_sync() as session:
+CACHE_HEADERS = {"Cache-Control": "private, no-cache"}
+
+def _respond(etag: str, body: bytes, if_none_match: str | None):
+    headers = {"ETag": etag, **CACHE_HEADERS}
+    if results.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+def _not_ready(status: str):
+    if status == "failed":
+        return HTTPException(status_code=404, detail="Image processing failed")
+    return HTTPException(
+        status_code=404,
+        detail="Recommendation not found or still processing",
+        headers={"Retry-After": "1"}
+    )
+
+async def _owner(image_id: str):
+    """
+    user_id that uploaded the image (None if unknown); cached, so the
+    check costs no DB I/O once the image has been seen. The recommendation
+    keeps the owner after cleanup has deleted the image row.
+    """
+    owner = results.owner_cache.get(image_id)
+    if owner is None:
+        async with async_session_factory() as session:
+            stmt = select(Image.user_id).where(Image.id == image_id)
+            owner = (await session.exec(stmt)).first()
+            if owner is None:
+                stmt = select(Recommendation.user_id).where(Recommendation.image_id == image_id)
+                owner = (await session.exec(stmt)).first()
+        if owner is not None:
+            results.owner_cache.set(image_id, owner)
+    return owner
+
+async def _authorize(image_id: str, user_id: str):
+    # Other users' images look exactly like missing ones
+    if await _owner(image_id) != user_id:
+        raise HTTPException(status_code=404, detail="Recommendation not found")
+
+async def _load_state(image_id: str):
+    """
+    Returns (status, etag, body); status is ready / failed / pending / missing.
+    """
+    cached = results.payload_cache.get(image_id)
+    if cached:
+        return ("ready", *cached)
+
+    async with async_session_factory() as session:
         stmt = select(Recommendation).where(Recommendation.image_id == image_id)
-        rec = session.exec(stmt).one_or_none()
+        rec = (await session.exec(stmt)).one_or_none()
+        if rec:
+            return ("ready", *results.serialize_recommendation(image_id, rec.ranked_outfits))
+
+        img = await session.get(Image, image_id)
+
+    if img is None:
+        return ("missing", None, None)
+    if img.status == "failed":
+        return ("failed", None, None)
+    return ("pending", None, None)
+
+async def _wait_for_state(image_id: str, timeout: float):
+    """
+    Block until the recommendation is ready / failed, or timeout passes.
+    Woken instantly by the in-process hub; the DB is re-checked every
+    EVENTS_POLL_INTERVAL in case the job finished in another process.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    future = hub.subscribe(image_id)
+
+    try:
+        while True:
+            state = await _load_state(image_id)
+            remaining = deadline - loop.time()
+            if state[0] not in ("pending", "missing") or remaining <= 0:
+                return state
+
+            if future.done():
+                # Published while we were loading: re-check right away
+                future = hub.subscribe(image_id)
+                continue
+            try:
+                await asyncio.wait_for(
+                    asyncio.shield(future), min(remaining, settings.EVENTS_POLL_INTERVAL)
+                )
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        hub.unsubscribe(image_id, future)
 
-        if not rec:
-            raise HTTPException(
-                status_code=404,
-                detail="Recommendation not found or still processing"
+@router.get("/{image_id}")
+async def get_recommendation(
+    image_id: str,
+    wait: float = Query(0, ge=0, le=settings.LONG_POLL_MAX_WAIT),
+    if_none_match: str | None = Header(None),
+    user_id: str = Depends(current_user_id)
+):
+    await _authorize(image_id, user_id)
+
+    # Hot path: finished payloads are served (or 304'd) from memory
+    cached = results.payload_cache.get(image_id)
+    if cached:
+        return _respond(*cached, if_none_match)
+
+    # Long-poll: hold the request until the result is there
+    if wait:
+        status, etag, body = await _wait_for_state(image_id, wait)
+        if status == "ready":
+            return _respond(etag, body, if_none_match)
+        raise _not_ready(status)
+
+    # Recently seen as "still processing" → skip the DB for a moment
+    if results.pending_cache.get(image_id):
+        raise _not_ready("pending")
+
+    status, etag, body = await _load_state(image_id)
+    if status != "ready":
+        if status == "pending":
+            results.pending_cache.set(image_id, True)
+        raise _not_ready(status)
+
+    return _respond(etag, body, if_none_match)
+
+@router.get("/{image_id}/events")
+async def recommendation_events(image_id: str, user_id: str = Depends(current_user_id_or_query)):
+    """
+    Server-sent events: one `ready` (with the payload) or `failed`
+    event, then the stream closes. Comments keep proxies from timing out.
+    EventSource can't send headers, so ?access_token= is accepted here.
+    """
+    await _authorize(image_id, user_id)
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.EVENTS_MAX_WAIT
+
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                yield "event: timeout\ndata: {}\n\n"
+                return
+
+            status, _, body = await _wait_for_state(
+                image_id, min(remaining, settings.EVENTS_KEEPALIVE)
             )
+            if status == "ready":
+                yield f"event: ready\ndata: {body.decode()}\n\n"
+                return
+            if status in ("failed", "missing"):
+                yield f"event: {status}\ndata: {json.dumps({'image_id': image_id})}\n\n"
+                return
+            yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/{image_id}/ws")
+async def recommendation_socket(websocket: WebSocket, image_id: str):
+    """
+    WebSocket variant: sends one JSON message when processing ends.
+    Authenticated by Bearer header or ?access_token=.
+    """
+    user_id = websocket_user_id(websocket)
+    if user_id is None or await _owner(image_id) != user_id:
+        await websocket.close(code=1008)  # policy violation
+        return
 
-        return {
-            "image_id": image_id,
-            "recommendation": rec.ranked_outfits
-        }
+    await websocket.accept()
 
+    status, _, body = await _wait_for_state(image_id, settings.EVENTS_MAX_WAIT)
+    message = {"image_id": image_id, "status": status if status != "pending" else "timeout"}
+    if status == "ready":
+        message["recommendation"] = json.loads(body)["recommendation"]
 
-   
\ No newline at end of file
+    await websocket.send_json(message)
+    await websocket.close()
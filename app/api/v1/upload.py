@@ -1,58 +1,205 @@
-from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, BackgroundTasks, HTTPException, Depends
+from sqlmodel.ext.asyncio.session import AsyncSession
 from uuid import uuid4
+import asyncio
 import datetime
 from app.core.config import settings
-from app.services import storage
-from app.services.processing import process_image_task
-from app.db.session import get_session_sync, create_db_and_tables
+from app.core.security import current_user_id
+from app.services import results, storage
+from app.services.features import storage_key
+from app.services.uploads import UploadRejected, read_image_stream
+from app.services.processing import process_image_batch_task, process_image_task
+from app.tasks import queue
+from app.db.session import get_async_session
 from app.db.models import Image
 from sqlmodel import select
 
 router = APIRouter()
 
+async def read_image(image: UploadFile):
+    """
+    Stream an uploaded image in chunks: checks the real file type from
+    its header, stops as soon as it is too large, hashes while reading.
+    """
+    try:
+        return await read_image_stream(image)
+    except UploadRejected as exc:
+        raise HTTPException(status_code=400, detail=f"{exc}: {image.filename}")
+
+async def retained_hashes(session: AsyncSession, content_hashes: set):
+    """
+    Hashes whose R2 object is still referenced by a non-expired image
+    (cleanup keeps those objects, so a repeat upload can reuse them).
+    Ends the read transaction: the pooled connection is not held idle
+    across the R2 uploads that follow.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+        hours=settings.IMAGE_RETENTION_HOURS
+    )
+    stmt = select(Image.content_hash).where(
+        Image.content_hash.in_(list(content_hashes)),
+        Image.uploaded_at >= cutoff
+    ).distinct()
+    retained = set((await session.exec(stmt)).all())
+    await session.commit()
+    return retained
+
 @router.post("/")
 async def upload_image(
     background_tasks: BackgroundTasks,
     image: UploadFile = File(...),
     occasion: str = Form(...),
-    user_id: str | None = Form(None)
+    user_id: str = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    # Check file type
-    if image.content_type.split("/")[0] != "image":
-        raise HTTPException(status_code=400, detail="Invalid file type")
-
-    # Read content
-    contents = await image.read()
-
-    # Check size
-    if len(contents) > settings.MAX_IMAGE_SIZE_BYTES:
-        raise HTTPException(status_code=400, detail="File too large")
+    upload = await read_image(image)
+    contents = upload.data
 
-    # Generate a unique ID
+    # Generate a unique ID; the object key is content-addressed
     image_id = str(uuid4())
-    s3_key = f"uploads/{image_id}_{image.filename}"
+    s3_key = storage_key(upload.sha256)
 
-    # Upload to Cloudflare R2
-    storage.upload_bytes(s3_key, contents, content_type=image.content_type)
+    # Upload to Cloudflare R2 (unless the same photo is already stored)
+    if not await retained_hashes(session, {upload.sha256}):
+        await storage.upload_bytes_async(s3_key, contents, content_type=upload.content_type)
 
     # Save DB record
-    create_db_and_tables()
-    with get_session_sync() as session:
-        img = Image(
-            id=image_id,
-            user_id=user_id,
-            s3_key=s3_key,
-            uploaded_at=datetime.datetime.utcnow(),
-            status="pending"
+    img = Image(
+        id=image_id,
+        user_id=user_id,
+        s3_key=s3_key,
+        content_hash=upload.sha256,
+        uploaded_at=datetime.datetime.utcnow(),
+        status="pending"
+    )
+    session.add(img)
+
+    if settings.PROCESSING_MODE == "queue":
+        # Durable job, committed together with the Image row
+        session.add(queue.new_job(
+            "process_image",
+            {
+                "image_id": image_id,
+                "s3_key": s3_key,
+                "content_hash": upload.sha256,
+                "occasion": occasion
+            },
+            lane="high"
+        ))
+        await session.commit()
+    else:
+        await session.commit()
+
+        # Start background processing (bytes are still in memory → no re-download)
+        background_tasks.add_task(
+            process_image_task, image_id, s3_key, occasion, contents, upload.sha256
         )
-        session.add(img)
-        session.commit()
 
-    # Start background processing
-    background_tasks.add_task(process_image_task, image_id, s3_key, occasion)
+    # The uploader's polls pass the ownership check without a DB lookup
+    results.owner_cache.set(image_id, user_id)
 
     return {
         "image_id": image_id,
         "status": "processing"
     }
 
+@router.post("/batch")
+async def upload_batch(
+    background_tasks: BackgroundTasks,
+    images: list[UploadFile] = File(...),
+    occasion: str = Form(...),
+    user_id: str = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Upload several images in one request; returns one batch handle.
+    """
+    if len(images) > settings.MAX_BATCH_IMAGES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many images (max {settings.MAX_BATCH_IMAGES})"
+        )
+
+    uploads = [await read_image(image) for image in images]
+
+    batch_id = str(uuid4())
+    items = [
+        {
+            "image_id": str(uuid4()),
+            "s3_key": storage_key(upload.sha256),
+            "content_hash": upload.sha256
+        }
+        for upload in uploads
+    ]
+
+    # Upload to Cloudflare R2 concurrently, each new photo once
+    new = {upload.sha256: upload for upload in uploads}
+    for content_hash in await retained_hashes(session, set(new)):
+        del new[content_hash]
+    await asyncio.gather(*(
+        storage.upload_bytes_async(
+            storage_key(content_hash), upload.data, content_type=upload.content_type
+        )
+        for content_hash, upload in new.items()
+    ))
+
+    # Save all DB records in one transaction
+    now = datetime.datetime.utcnow()
+    session.add_all([
+        Image(
+            id=it["image_id"],
+            user_id=user_id,
+            batch_id=batch_id,
+            s3_key=it["s3_key"],
+            content_hash=it["content_hash"],
+            uploaded_at=now,
+            status="pending"
+        )
+        for it in items
+    ])
+
+    if settings.PROCESSING_MODE == "queue":
+        session.add(queue.new_job(
+            "process_image_batch",
+            {"batch_id": batch_id, "images": items, "occasion": occasion},
+            lane="default"
+        ))
+        await session.commit()
+    else:
+        await session.commit()
+
+        data_by_id = {it["image_id"]: upload.data for it, upload in zip(items, uploads)}
+        background_tasks.add_task(process_image_batch_task, items, occasion, data_by_id)
+
+    for it in items:
+        results.owner_cache.set(it["image_id"], user_id)
+
+    return {
+        "batch_id": batch_id,
+        "status": "processing",
+        "images": [{"image_id": it["image_id"], "status": "pending"} for it in items]
+    }
+
+@router.get("/batch/{batch_id}")
+async def get_batch(
+    batch_id: str,
+    user_id: str = Depends(current_user_id),
+    session: AsyncSession = Depends(get_async_session)
+):
+    """
+    Per-image status of a batch upload.
+    """
+    stmt = select(Image.id, Image.status).where(
+        Image.batch_id == batch_id, Image.user_id == user_id
+    )
+    rows = (await session.exec(stmt)).all()
+
+    if not rows:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    pending = sum(1 for r in rows if r.status == "pending")
+    return {
+        "batch_id": batch_id,
+        "status": "processing" if pending else "done",
+        "images": [{"image_id": r.id, "status": r.status} for r in rows]
+    }
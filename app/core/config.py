@@ -2,17 +2,73 @@ from pydantic import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 20
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_AUTO_MIGRATE: bool = True  # create schema at startup (else run app.db.migrate)
     S3_ENDPOINT_URL: str
     S3_ACCESS_KEY: str
     S3_SECRET_KEY: str
     S3_BUCKET: str
+    S3_MAX_POOL_CONNECTIONS: int = 32
+    S3_CONNECT_TIMEOUT: float = 5
+    S3_READ_TIMEOUT: float = 30
+    S3_MAX_ATTEMPTS: int = 3
 
     SECRET_KEY: str
     ALGORITHM: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int
+    TOKEN_CACHE_SIZE: int = 10000
+    TOKEN_CACHE_TTL: float = 300  # verified tokens skip signature checks this long
+    HASH_WORKERS: int = 0  # bcrypt threads, 0 = one per CPU core
+    HASH_QUEUE_SIZE: int = 16
+    HASH_QUEUE_TIMEOUT: float = 0  # seconds to wait for a slot before 503
 
     IMAGE_RETENTION_HOURS: int
+    CLEANUP_BATCH_SIZE: int = 1000  # S3 delete_objects caps at 1000 keys
     MAX_IMAGE_SIZE_BYTES: int
+    MAX_BATCH_IMAGES: int = 20
+    MAX_IMAGE_PIXELS: int = 40_000_000  # decoded width * height (~120 MB as BGR)
+    UPLOAD_CHUNK_SIZE: int = 64 * 1024
+
+    CATALOG_REFRESH_SECONDS: int = 300
+    RECOMMENDATION_CACHE_SIZE: int = 256
+    RECOMMENDATION_CACHE_TTL: float = 3600
+    RANKING_TOP_K: int = 20  # ranked candidates kept per outfit slot
+    RULES_FILE: str = ""  # empty = app/services/rules.json
+    RULES_RELOAD_SECONDS: float = 5  # mtime check interval, 0 = load once
+
+    RESULT_CACHE_SIZE: int = 10000
+    RESULT_CACHE_TTL: float = 600
+    RESULT_PENDING_TTL: float = 1
+    FEATURE_CACHE_SIZE: int = 10000
+    FEATURE_CACHE_TTL: float = 3600
+
+    LONG_POLL_MAX_WAIT: float = 60
+    EVENTS_MAX_WAIT: float = 300
+    EVENTS_KEEPALIVE: float = 15
+    EVENTS_POLL_INTERVAL: float = 5  # DB re-check for jobs finished elsewhere
+    EVENTS_NOTIFY_INTERVAL: float = 0.1  # completion feed poll while requests wait
+    EVENTS_RETENTION_HOURS: int = 1  # completion feed rows kept
+
+    ANALYSIS_WORKERS: int = 0  # 0 = one per CPU core
+    ANALYSIS_QUEUE_SIZE: int = 32
+    ANALYSIS_QUEUE_TIMEOUT: float = 30
+
+    FACE_DETECT_MAX_SIDE: int = 800  # 0 = detect on the full-resolution image
+    MAX_FACES: int = 10  # faces kept per photo (largest first)
+    SKIN_TONE_TRIM: float = 0.1  # share of darkest / brightest face pixels ignored
+
+    PROCESSING_MODE: str = "inline"  # inline = in the API process, queue = app.tasks.worker
+    JOB_WORKER_CONCURRENCY: int = 2
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 5
+    JOB_RETRY_BACKOFF_MAX: float = 300
+    JOB_POLL_INTERVAL: float = 1
+    JOB_LEASE_SECONDS: float = 600
+    JOB_STATS_INTERVAL: float = 60
+    WORKER_METRICS_PORT: int = 0  # worker's Prometheus port (the API serves /metrics)
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,177 @@
+"""
+Prometheus metrics: per-stage timers, storage / DB / request latency,
+and gauges for in-flight work. Exposed on GET /metrics (API) and on
+--metrics-port (worker).
+
+Timers are a perf_counter pair plus a histogram observe, cheap enough
+to leave on in production. Extra span consumers (tracing, logging) can
+be plugged in with on_span(listener).
+"""
+
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages range from sub-millisecond (rules) to seconds (extract)
+STAGE_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30
+)
+
+STAGE_SECONDS = Histogram(
+    "stylemate_stage_seconds",
+    "Time spent per processing stage",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+STORAGE_SECONDS = Histogram(
+    "stylemate_storage_seconds",
+    "R2 / S3 call latency",
+    ["operation"],
+    buckets=STAGE_BUCKETS
+)
+DB_QUERY_SECONDS = Histogram(
+    "stylemate_db_query_seconds",
+    "SQL statement latency",
+    ["statement"],
+    buckets=STAGE_BUCKETS
+)
+REQUEST_SECONDS = Histogram(
+    "stylemate_http_request_seconds",
+    "HTTP request latency (until the response starts)",
+    ["method", "route", "status"],
+    buckets=STAGE_BUCKETS
+)
+JOB_SECONDS = Histogram(
+    "stylemate_job_seconds",
+    "Queue job run time",
+    ["kind", "outcome"],
+    buckets=STAGE_BUCKETS
+)
+JOBS_IN_PROGRESS = Gauge(
+    "stylemate_jobs_in_progress",
+    "Queue jobs currently running in this process",
+    ["kind"]
+)
+BACKGROUND_TASKS = Gauge(
+    "stylemate_background_tasks",
+    "Inline background tasks currently running in this process",
+    ["kind"]
+)
+STAGE_ERRORS = Counter(
+    "stylemate_stage_errors_total",
+    "Stages that raised",
+    ["stage"]
+)
+
+_span_listeners = []
+
+SQL_VERBS = {"SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "CREATE", "ALTER"}
+
+
+def on_span(listener):
+    """
+    Register listener(name, seconds, error) called after every stage().
+    """
+    _span_listeners.append(listener)
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Time a block as one processing stage.
+    """
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as exc:
+        error = exc
+        STAGE_ERRORS.labels(name).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(name).observe(elapsed)
+        for listener in _span_listeners:
+            try:
+                listener(name, elapsed, error)
+            except Exception:
+                logger.exception("Span listener failed")
+
+
+# ---------- database ----------
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is None:
+        return
+    verb = statement.lstrip().split(None, 1)[0].upper() if statement else ""
+    DB_QUERY_SECONDS.labels(verb if verb in SQL_VERBS else "OTHER").observe(
+        time.perf_counter() - started
+    )
+
+
+def instrument_engine(engine):
+    """
+    Time every statement run on a (sync) SQLAlchemy engine.
+    """
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+# ---------- scrape-time gauges ----------
+
+class CallbackGauge:
+    """
+    Gauge read at scrape time: fn() returns {label values tuple: value}.
+    """
+
+    def __init__(self, name: str, documentation: str, labels: list, fn):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.fn = fn
+
+    def describe(self):
+        # Without describe(), REGISTRY.register() would call collect() (and
+        # fn, e.g. a DB query) at import time
+        yield GaugeMetricFamily(self.name, self.documentation, labels=self.labels)
+
+    def collect(self):
+        family = GaugeMetricFamily(self.name, self.documentation, labels=self.labels)
+        try:
+            values = self.fn()
+        except Exception:
+            logger.exception("Collecting %s failed", self.name)
+            values = {}
+        for label_values, value in values.items():
+            family.add_metric(list(label_values), value)
+        yield family
+
+
+def register_callback(name: str, documentation: str, labels: list, fn):
+    REGISTRY.register(CallbackGauge(name, documentation, labels, fn))
+
+
+def render():
+    """
+    (body, content type) for a /metrics response.
+    """
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,232 @@
+"""
+Password hashing and access tokens.
+
+Password hashing runs on a dedicated, bounded thread pool.
+
+bcrypt costs 100-300ms of CPU per call. On the event loop (or FastAPI's
+shared threadpool) a burst of logins would starve every other request.
+Hashes run on HASH_WORKERS threads instead (bcrypt releases the GIL),
+with at most HASH_QUEUE_SIZE more calls waiting. Past that, callers get
+HashingBusy after HASH_QUEUE_TIMEOUT seconds and the API answers 503.
+
+Access tokens are signed JWTs (SECRET_KEY / ALGORITHM), verified without
+a DB round trip; verified tokens are kept in a small TTL cache so repeat
+requests skip the signature check too.
+"""
+
+import asyncio
+import datetime
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Depends, HTTPException, Query, WebSocket, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from passlib.hash import bcrypt
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+
+
+class HashingBusy(Exception):
+    pass
+
+
+class InvalidToken(Exception):
+    pass
+
+
+_executor = None
+_slots = None
+_dummy_hash = None
+_lock = threading.Lock()
+
+
+def worker_count():
+    return settings.HASH_WORKERS or os.cpu_count() or 1
+
+
+def _get_executor():
+    global _executor, _slots
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = worker_count()
+                _slots = threading.BoundedSemaphore(workers + settings.HASH_QUEUE_SIZE)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+    return _executor
+
+
+async def _acquire_slot(slots, timeout: float):
+    if slots.acquire(blocking=False):
+        return True
+    if timeout <= 0:
+        return False
+
+    waiting = asyncio.get_running_loop().run_in_executor(
+        None, lambda: slots.acquire(timeout=timeout)
+    )
+    try:
+        return await asyncio.shield(waiting)
+    except asyncio.CancelledError:
+        # The acquire thread keeps running; give back what it gets
+        waiting.add_done_callback(
+            lambda f: slots.release() if not f.cancelled() and f.result() else None
+        )
+        raise
+
+
+async def _run(fn, *args):
+    executor = _get_executor()
+    slots = _slots
+
+    # Saturated → fail fast instead of queueing behind seconds of bcrypt work
+    if not await _acquire_slot(slots, settings.HASH_QUEUE_TIMEOUT):
+        raise HashingBusy("Password hashing is saturated")
+
+    # The slot is held until bcrypt finishes in the pool, even if the
+    # request awaiting it is cancelled (client disconnect) before that
+    try:
+        future = executor.submit(fn, *args)
+    except BaseException:
+        slots.release()
+        raise
+    future.add_done_callback(lambda f: slots.release())
+    return await asyncio.wrap_future(future)
+
+
+def _get_dummy_hash():
+    global _dummy_hash
+
+    # Same algorithm and cost as real hashes, so a dummy verify takes as long
+    if _dummy_hash is None:
+        with _lock:
+            if _dummy_hash is None:
+                _dummy_hash = bcrypt.hash(os.urandom(16).hex())
+    return _dummy_hash
+
+
+def _verify(password: str, password_hash: str = None):
+    if password_hash is None:
+        bcrypt.verify(password, _get_dummy_hash())
+        return False
+    return bcrypt.verify(password, password_hash)
+
+
+async def hash_password(password: str):
+    return await _run(bcrypt.hash, password)
+
+
+async def verify_password(password: str, password_hash: str = None):
+    """
+    Check a password; password_hash=None (unknown account) still runs
+    a full bcrypt verify against a dummy hash, so unknown emails take
+    as long as wrong passwords and are indistinguishable by timing.
+    """
+    return await _run(_verify, password, password_hash)
+
+
+# ---------- access tokens ----------
+
+token_cache = TTLCache(maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_TTL)
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+def create_access_token(user_id: str, expires_minutes: int = None):
+    """
+    Signed access token for user_id; returns (token, expires_in seconds).
+    """
+    expires_in = 60 * (expires_minutes or settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    now = datetime.datetime.utcnow()
+    claims = {
+        "sub": user_id,
+        "type": "access",
+        "iat": now,
+        "exp": now + datetime.timedelta(seconds=expires_in),
+    }
+    return jwt.encode(claims, settings.SECRET_KEY, algorithm=settings.ALGORITHM), expires_in
+
+
+def verify_access_token(token: str):
+    """
+    user_id of a valid token; raises InvalidToken. No DB access.
+    """
+    cached = token_cache.get(token)
+    if cached is not None:
+        user_id, expires_at = cached
+        if expires_at > time.time():
+            return user_id
+        token_cache.pop(token)
+        raise InvalidToken("Token expired")
+
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    except JWTError as exc:
+        raise InvalidToken(str(exc))
+
+    user_id = claims.get("sub")
+    if not user_id or claims.get("type") != "access":
+        raise InvalidToken("Not an access token")
+
+    # Cache, but never beyond the token's own expiry
+    expires_at = claims["exp"]
+    token_cache.set(
+        token, (user_id, expires_at), ttl=min(settings.TOKEN_CACHE_TTL, expires_at - time.time())
+    )
+    return user_id
+
+
+def _unauthorized():
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+
+def _user_id_or_401(token: str = None):
+    if not token:
+        raise _unauthorized()
+    try:
+        return verify_access_token(token)
+    except InvalidToken:
+        raise _unauthorized()
+
+
+async def current_user_id(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme)
+):
+    """
+    FastAPI dependency: user id from the Authorization: Bearer token.
+    """
+    return _user_id_or_401(credentials.credentials if credentials else None)
+
+
+async def current_user_id_or_query(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer_scheme),
+    access_token: str | None = Query(None)
+):
+    """
+    Like current_user_id, but also accepts ?access_token= for clients
+    that cannot set headers (EventSource).
+    """
+    return _user_id_or_401(credentials.credentials if credentials else access_token)
+
+
+def websocket_user_id(websocket: WebSocket):
+    """
+    User id for a WebSocket (Bearer header or ?access_token=), or None.
+    """
+    scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        token = websocket.query_params.get("access_token")
+    if not token:
+        return None
+    try:
+        return verify_access_token(token)
+    except InvalidToken:
+        return None
@@ -0,0 +1,82 @@
+"""
+Schema setup, run once per deploy instead of on every request.
+
+    python -m app.db.migrate
+
+The API also runs it at startup when DB_AUTO_MIGRATE is on.
+"""
+
+import time
+
+from sqlalchemy import inspect, text
+from sqlmodel import SQLModel, select
+
+from app.db.models import Product
+from app.db.session import create_db_and_tables, engine, get_session_sync
+from app.services.colors import apply_color
+
+
+def backfill_product_colors(batch_size: int = 1000):
+    """
+    Store LAB colour vectors for products ingested before they existed.
+    Rows with an unknown colour stay NULL and are checked again next run.
+    Returns the number of rows updated.
+    """
+    updated = 0
+    last_id = ""
+    with get_session_sync() as session:
+        while True:
+            stmt = (
+                select(Product)
+                .where(Product.color_l.is_(None), Product.id > last_id)
+                .order_by(Product.id)
+                .limit(batch_size)
+            )
+            rows = session.exec(stmt).all()
+            if not rows:
+                return updated
+            last_id = rows[-1].id
+            for p in rows:
+                if apply_color(p).color_l is not None:
+                    session.add(p)
+                    updated += 1
+            session.commit()
+
+
+def backfill_recommendation_owners():
+    """
+    Copy the owner onto recommendations stored before they kept one,
+    while their image still exists. Returns the number of rows updated.
+    """
+    with engine.begin() as conn:
+        return conn.execute(text(
+            "UPDATE recommendation SET user_id = "
+            "(SELECT image.user_id FROM image WHERE image.id = recommendation.image_id) "
+            "WHERE user_id IS NULL AND image_id IN "
+            "(SELECT id FROM image WHERE user_id IS NOT NULL)"
+        )).rowcount
+
+
+def migrate():
+    """
+    Create missing tables / indexes and backfill derived columns.
+    Returns the elapsed seconds.
+    """
+    start = time.perf_counter()
+    create_db_and_tables()
+    backfill_product_colors()
+    backfill_recommendation_owners()
+    return time.perf_counter() - start
+
+
+def schema_is_ready():
+    """
+    True when every table the models need exists.
+    """
+    existing = set(inspect(engine).get_table_names())
+    return set(SQLModel.metadata.tables).issubset(existing)
+
+
+if __name__ == "__main__":
+    elapsed = migrate()
+    print(f"Schema ready in {elapsed:.3f}s")
@@ -1,19 +1,25 @@
-from sqlmodel import SQLModel, Field, JSON
+from sqlmodel import SQLModel, Field, Column, JSON
+from sqlalchemy import Index
 import datetime
 from typing import Optional, List
 
 
 class User(SQLModel, table=True):
     id: str = Field(primary_key=True)
-    email: str
+    email: str = Field(index=True, unique=True)
     password_hash: str
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
 
 
 class Image(SQLModel, table=True):
+    # Cleanup scans expired rows in (uploaded_at, id) order
+    __table_args__ = (Index("ix_image_uploaded_at_id", "uploaded_at", "id"),)
+
     id: str = Field(primary_key=True)
-    user_id: Optional[str] = Field(default=None)
-    s3_key: str
+    user_id: Optional[str] = Field(default=None, index=True)
+    batch_id: Optional[str] = Field(default=None, index=True)
+    s3_key: str  # uploads/sha256/<content_hash>: shared by repeat uploads
+    content_hash: Optional[str] = Field(default=None, index=True)
     uploaded_at: datetime.datetime
     processed_at: Optional[datetime.datetime] = None
     status: str  # pending / processed / failed
@@ -22,19 +28,72 @@ class Image(SQLModel, table=True):
     proportions: Optional[str] = None
 
 
+class ImageFeatures(SQLModel, table=True):
+    """
+    Features extracted from an image, keyed by its SHA-256.
+    """
+    content_hash: str = Field(primary_key=True)
+    features: dict = Field(sa_column=Column(JSON))
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+
 class Recommendation(SQLModel, table=True):
+    # One recommendation per image: a re-run job must not store a second
+    __table_args__ = (Index("ux_recommendation_image_id", "image_id", unique=True),)
+
     id: str = Field(primary_key=True)
     image_id: str
-    ranked_outfits: JSON  # this will store the 5 recommendations as JSON
+    user_id: Optional[str] = None  # owner; the image row is deleted by cleanup
+    ranked_outfits: list = Field(sa_column=Column(JSON))  # this will store the 5 recommendations as JSON
     created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
 
 
+class CompletionEvent(SQLModel, table=True):
+    """
+    "Image finished" notice, written with the result. API processes relay
+    new rows to their waiters (app.services.events.CompletionFeed), so
+    jobs finished by a worker process wake them too.
+    """
+    id: Optional[int] = Field(default=None, primary_key=True)
+    image_id: str
+    status: str  # ready / failed
+    created_at: datetime.datetime = Field(default_factory=datetime.datetime.utcnow, index=True)
+
+
 class Product(SQLModel, table=True):
     id: str = Field(primary_key=True)
     name: str
     image_url: str
     price: float
-    category: str
-    color: str
-    tags: str
+    category: str = Field(index=True)
+    color: str = Field(index=True)
+    # CIELAB of `color`, set at ingest (app.services.colors.apply_color)
+    color_l: Optional[float] = None
+    color_a: Optional[float] = None
+    color_b: Optional[float] = None
+    tags: str  # searched in memory: see app/services/catalog.py
     link: str
+
+
+class Job(SQLModel, table=True):
+    """
+    Durable work item, claimed by app.tasks.worker processes.
+    """
+    # Workers claim the next queued job by (status, lane, priority, run_after)
+    __table_args__ = (Index("ix_job_claim", "status", "lane", "priority", "run_after"),)
+
+    id: str = Field(primary_key=True)
+    kind: str
+    payload: dict = Field(sa_column=Column(JSON))
+    lane: str = "default"  # high / default / bulk
+    priority: int = 10  # lower runs first
+    status: str = "queued"  # queued / running / done / failed
+    attempts: int = 0
+    max_attempts: int = 3
+    run_after: datetime.datetime
+    enqueued_at: datetime.datetime
+    started_at: Optional[datetime.datetime] = None
+    heartbeat_at: Optional[datetime.datetime] = None  # renewed while running
+    finished_at: Optional[datetime.datetime] = None
+    locked_by: Optional[str] = None
+    last_error: Optional[str] = None
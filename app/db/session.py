@@ -1,15 +1,129 @@
+from sqlalchemy import event, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
 from sqlmodel import SQLModel, create_engine, Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from app.core import metrics
 from app.core.config import settings
+# Registers the tables on SQLModel.metadata before create_all
+from app.db import models  # noqa: F401
 
-# Use SQLite for development
+# DATABASE_URL may name either driver; derive the sync and async flavours
+SYNC_DRIVERS = {
+    "sqlite+aiosqlite": "sqlite",
+    "postgresql+asyncpg": "postgresql",
+}
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def _with_driver(url: str, drivers: dict):
+    scheme, sep, rest = url.partition("://")
+    return drivers.get(scheme, scheme) + sep + rest
+
+
+SYNC_DATABASE_URL = _with_driver(settings.DATABASE_URL, SYNC_DRIVERS)
+ASYNC_DATABASE_URL = _with_driver(settings.DATABASE_URL, ASYNC_DRIVERS)
+IS_SQLITE = SYNC_DATABASE_URL.startswith("sqlite")
+
+
+def _pool_kwargs():
+    if IS_SQLITE:
+        return {}
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL lets readers run while a writer is active
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+
+# Sync engine: scripts, background tasks and the cleanup job
 engine = create_engine(
-    settings.DATABASE_URL,
+    SYNC_DATABASE_URL,
     echo=False,
-    connect_args={"check_same_thread": False}
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **_pool_kwargs()
 )
 
+# Async engine: FastAPI routes
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    echo=False,
+    **_pool_kwargs()
+)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _set_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+async_session_factory = sessionmaker(
+    async_engine, class_=AsyncSession, expire_on_commit=False
+)
+
+def _add_missing_columns():
+    """
+    create_all never alters existing tables; add new nullable columns
+    so older databases keep working without a migration tool.
+    """
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing or not column.nullable:
+                    continue
+                col_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}"))
+
+def _drop_duplicate_recommendations():
+    """
+    Older databases may hold several recommendations per image (a job
+    re-run after a crash); keep one so the unique index can be built.
+    """
+    indexes = {i["name"] for i in inspect(engine).get_indexes("recommendation")}
+    if "ux_recommendation_image_id" in indexes:
+        return
+    with engine.begin() as conn:
+        conn.execute(text(
+            "DELETE FROM recommendation WHERE id NOT IN "
+            "(SELECT MIN(id) FROM recommendation GROUP BY image_id)"
+        ))
+
 def create_db_and_tables():
     SQLModel.metadata.create_all(engine)
+    _add_missing_columns()
+    _drop_duplicate_recommendations()
+
+    # create_all skips tables that already exist, so make sure their
+    # secondary indexes are there too
+    for table in SQLModel.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 def get_session_sync():
     return Session(engine)
+
+async def get_async_session():
+    """
+    FastAPI dependency: one pooled async session per request.
+    """
+    async with async_session_factory() as session:
+        yield session
@@ -1,22 +1,154 @@
-from fastapi import FastAPI
+import logging
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response
 from app.api.v1.upload import router as upload_router
 from app.api.v1.recommendations import router as recommendations_router
 from app.api.v1.auth import router as auth_router
+from app.core import metrics
+from app.core.config import settings
+from app.core.security import token_cache
+from app.db.migrate import migrate, schema_is_ready
 from app.tasks.cleanup import start_scheduler
+from app.tasks import queue
+from app.services import analysis, results
+from app.services.events import completion_feed, hub
+from app.services.features import features_cache
+from app.services.recommender import recommendation_cache
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Stylemate Backend")
+app.state.ready = False
+app.state.startup_timings = {}
 
 # Register API routes
 app.include_router(upload_router, prefix="/api/v1/upload", tags=["upload"])
 app.include_router(recommendations_router, prefix="/api/v1/recommendations", tags=["recommendations"])
 app.include_router(auth_router, prefix="/api/v1/auth", tags=["auth"])
 
+# Scrape-time gauges (the worker process exports its own job metrics)
+metrics.register_callback(
+    "stylemate_queue_jobs", "Jobs in the durable queue", ["lane", "status"], queue.depth
+)
+metrics.register_callback(
+    "stylemate_recommendation_waiters", "Open long-poll / SSE / WebSocket waits", [],
+    lambda: {(): hub.waiting()}
+)
+
+@app.middleware("http")
+async def refuse_until_ready(request: Request, call_next):
+    # Only health checks and metrics are served until the schema is in place
+    path = request.url.path
+    if not app.state.ready and not (path.startswith("/health") or path == "/metrics"):
+        return JSONResponse(
+            status_code=503,
+            content={"detail": "Service is starting up"},
+            headers={"Retry-After": "5"}
+        )
+    return await call_next(request)
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse before the multipart body is read (and spooled) at all.
+    # Chunked requests carry no Content-Length and are only checked
+    # after the body was received (app.services.uploads)
+    if request.method == "POST" and request.url.path.startswith("/api/v1/upload"):
+        files = settings.MAX_BATCH_IMAGES if request.url.path.rstrip("/").endswith("/batch") else 1
+        limit = files * settings.MAX_IMAGE_SIZE_BYTES + 64 * 1024  # + multipart overhead
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit:
+            return JSONResponse(status_code=413, content={"detail": "Request too large"})
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+
+    # Label by route template, not the raw path (image ids would explode cardinality)
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.labels(
+        request.method, route.path if route else "unmatched", response.status_code
+    ).observe(time.perf_counter() - started)
+    return response
+
 @app.on_event("startup")
 def startup():
+    timings = app.state.startup_timings
+    started = time.perf_counter()
+
+    # Create / upgrade the schema once, before taking traffic
+    if settings.DB_AUTO_MIGRATE:
+        try:
+            timings["migrate_seconds"] = round(migrate(), 3)
+        except Exception:
+            logger.exception("Schema migration failed; staying not-ready")
+
+    step = time.perf_counter()
+    app.state.ready = schema_is_ready()
+    timings["schema_check_seconds"] = round(time.perf_counter() - step, 3)
+
     # Start scheduled cleanup job
     start_scheduler()
 
+    # Warm up the image analysis process pool (queue mode analyses in the workers)
+    if settings.PROCESSING_MODE == "inline":
+        step = time.perf_counter()
+        analysis.start()
+        timings["analysis_pool_seconds"] = round(time.perf_counter() - step, 3)
+
+    timings["total_seconds"] = round(time.perf_counter() - started, 3)
+    logger.info("Startup finished: ready=%s timings=%s", app.state.ready, timings)
+
+@app.on_event("startup")
+async def start_completion_feed():
+    # Wakes waiters for jobs finished in worker processes
+    completion_feed.start()
+
+@app.on_event("shutdown")
+async def stop_completion_feed():
+    await completion_feed.stop()
+
+@app.on_event("shutdown")
+def shutdown():
+    analysis.shutdown()
+
+@app.get("/health/live")
+def live():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+async def ready():
+    # Pick up a schema that was migrated after startup
+    if not app.state.ready:
+        app.state.ready = await run_in_threadpool(schema_is_ready)
+
+    body = {"ready": app.state.ready, "startup": app.state.startup_timings}
+    return JSONResponse(status_code=200 if app.state.ready else 503, content=body)
+
+@app.get("/health/caches")
+def cache_stats():
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "result_payloads": results.payload_cache.stats(),
+        "result_pending": results.pending_cache.stats(),
+        "image_features": features_cache.stats(),
+        "image_owners": results.owner_cache.stats(),
+        "access_tokens": token_cache.stats(),
+    }
+
+@app.get("/health/queue")
+def queue_stats():
+    return queue.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    body, content_type = metrics.render()
+    return Response(content=body, headers={"Content-Type": content_type})
+
 @app.get("/")
 def root():
     return {"message": "Stylemate backend is working"}
-
@@ -1,6 +1,8 @@
 from sqlmodel import Session
 from app.db.session import create_db_and_tables, engine
 from app.db.models import Product
+from app.services.catalog import catalog
+from app.services.colors import apply_color
 import uuid
 
 
@@ -56,6 +58,7 @@ def seed_products():
     create_db_and_tables()
 
     with Session(engine) as session:
+        products = []
         for p in sample_products:
             prod = Product(
                 id=str(uuid.uuid4()),
@@ -67,9 +70,16 @@ def seed_products():
                 tags=p["tags"],
                 link=p["link"]
             )
+            apply_color(prod)
             session.add(prod)
+            products.append(prod)
 
         session.commit()
+        for prod in products:
+            session.refresh(prod)
+
+        # Keep the in-process catalog index in sync
+        catalog.upsert(products)
         print("Seeded sample products successfully!")
 
 
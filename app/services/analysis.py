@@ -0,0 +1,169 @@
+"""
+Dedicated process pool for CPU-bound image analysis.
+
+Face detection and LAB conversion run in worker processes instead of
+the API worker, so they do not compete with request handling for the
+GIL. Each worker loads the Haar cascade once at start-up. The number of
+in-flight jobs is capped (workers + ANALYSIS_QUEUE_SIZE); callers block
+up to ANALYSIS_QUEUE_TIMEOUT seconds for a free slot.
+
+A worker that dies (e.g. OOM-killed) breaks the whole pool; the next
+submit replaces it with a fresh one instead of failing every job.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisQueueFull(Exception):
+    pass
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+def worker_count():
+    return settings.ANALYSIS_WORKERS or os.cpu_count() or 1
+
+
+def _init_worker():
+    import cv2
+
+    # One process per core already; avoid OpenCV oversubscribing threads
+    cv2.setNumThreads(1)
+
+    # Importing the processing module loads face_cascade once per worker
+    from app.services import processing
+    processing.face_cascade.empty()
+
+
+def _noop():
+    return os.getpid()
+
+
+def _analyze_bytes(data: bytes):
+    from app.services.processing import process_image_bytes
+    return process_image_bytes(data)
+
+
+def _pool():
+    """
+    (executor, slots) of the current pool, started on first use.
+    """
+    global _executor, _slots
+
+    with _lock:
+        if _executor is None:
+            workers = worker_count()
+            _slots = threading.BoundedSemaphore(workers + settings.ANALYSIS_QUEUE_SIZE)
+            _executor = ProcessPoolExecutor(
+                max_workers=workers,
+                # spawn: never fork a process that already runs threads
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor, _slots
+
+
+def get_executor():
+    return _pool()[0]
+
+
+def start():
+    """
+    Spin up every worker now so the first upload doesn't pay for it.
+    """
+    executor = get_executor()
+    futures = [executor.submit(_noop) for _ in range(worker_count())]
+    for f in futures:
+        f.result()
+
+
+def shutdown():
+    global _executor, _slots
+
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        _slots = None
+
+
+def _discard(executor):
+    """
+    Drop a broken pool so the next get_executor() starts a new one.
+    """
+    global _executor, _slots
+
+    with _lock:
+        if _executor is executor:
+            _executor = None
+            _slots = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit(fn, *args):
+    """
+    Queue fn(*args) on the pool; raises AnalysisQueueFull when the
+    bounded queue stays full for ANALYSIS_QUEUE_TIMEOUT seconds.
+    A broken pool is replaced and the job submitted once more.
+    """
+    try:
+        return _submit(fn, *args)
+    except BrokenProcessPool:
+        logger.warning("Analysis pool is broken (a worker died); starting a new one")
+        return _submit(fn, *args)
+
+
+def _submit(fn, *args):
+    executor, slots = _pool()
+
+    if not slots.acquire(timeout=settings.ANALYSIS_QUEUE_TIMEOUT):
+        raise AnalysisQueueFull("Image analysis queue is full")
+
+    try:
+        future = executor.submit(fn, *args)
+    except BrokenProcessPool:
+        slots.release()
+        _discard(executor)
+        raise
+    except Exception:
+        slots.release()
+        raise
+
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+
+def analyze_bytes(data: bytes):
+    """
+    Run process_image_bytes in the pool; the encoded image is sent to
+    the worker over the pool pipe, never written to disk.
+    """
+    return submit(_analyze_bytes, data).result()
+
+
+def analyze_many(datas: list[bytes]):
+    """
+    Analyse several images in parallel across the pool workers.
+    Returns features (or the raised exception) per input, in order.
+    """
+    futures = [submit(_analyze_bytes, data) for data in datas]
+
+    out = []
+    for future in futures:
+        try:
+            out.append(future.result())
+        except Exception as exc:
+            out.append(exc)
+    return out
@@ -0,0 +1,317 @@
+"""
+In-memory product catalog index.
+
+The catalog is loaded from the database once and kept in inverted
+indexes keyed by tag token, category and color, so tag lookups never
+touch the DB. New and deleted products are picked up by a cheap
+incremental refresh (an id-only query) every CATALOG_REFRESH_SECONDS.
+
+For ranking, matrix() exposes the same catalog as NumPy arrays (one
+row per product), rebuilt lazily once per catalog version.
+"""
+
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.session import get_session_sync
+from app.db.models import Product
+from app.services.colors import color_to_lab
+
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str):
+    """
+    Split free text into lowercase alphanumeric tokens.
+    """
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+class CatalogMatrix:
+    """
+    Column arrays of one catalog version, row i = products[i]:
+    category codes into their vocabulary, price, colour codes into the
+    table of distinct LAB colours (a NaN row for unknown colours) and
+    tag postings in CSR form (rows of token t are
+    tag_rows[tag_ptr[t]:tag_ptr[t + 1]]).
+    """
+
+    def __init__(self, products, by_token):
+        self.products = tuple(products)
+        row = {p.id: i for i, p in enumerate(self.products)}
+
+        self.categories, self.category = self._codes(p.category for p in self.products)
+        self.price = np.fromiter(
+            (p.price or 0 for p in self.products), dtype=np.float32, count=len(row)
+        )
+        labs = {}
+        self.color = np.fromiter(
+            (labs.setdefault(self._lab(p), len(labs)) for p in self.products),
+            dtype=np.int32, count=len(row)
+        )
+        self.lab_table = np.array(
+            [lab or (np.nan, np.nan, np.nan) for lab in labs], dtype=np.float32
+        ).reshape(-1, 3)
+
+        self.tokens = {}
+        ptr = [0]
+        rows = []
+        for token, ids in by_token.items():
+            self.tokens[token] = len(ptr) - 1
+            rows.extend(row[i] for i in ids)
+            ptr.append(len(rows))
+        self.tag_ptr = np.asarray(ptr, dtype=np.int64)
+        self.tag_rows = np.asarray(rows, dtype=np.int32)
+
+    @staticmethod
+    def _lab(p):
+        if p.color_l is not None:
+            return p.color_l, p.color_a, p.color_b
+        # Rows ingested before colours were stored
+        return color_to_lab(p.color)
+
+    @staticmethod
+    def _codes(values):
+        vocab = {}
+        codes = [vocab.setdefault((v or "").lower(), len(vocab)) for v in values]
+        return vocab, np.asarray(codes, dtype=np.int32)
+
+    def tag_overlap(self, phrase: str):
+        """
+        Share of the phrase's tokens found in each product's tags (0..1).
+        """
+        tokens = set(tokenize(phrase))
+        if not tokens or not self.products:
+            return np.zeros(len(self.products), dtype=np.float32)
+        postings = [
+            self.tag_rows[self.tag_ptr[t]:self.tag_ptr[t + 1]]
+            for t in (self.tokens.get(tok) for tok in tokens) if t is not None
+        ]
+        if not postings:
+            return np.zeros(len(self.products), dtype=np.float32)
+        counts = np.bincount(np.concatenate(postings), minlength=len(self.products))
+        return counts.astype(np.float32) / len(tokens)
+
+    def __len__(self):
+        return len(self.products)
+
+
+class CatalogIndex:
+    """
+    Inverted index over the product table.
+
+    A tag phrase ("ankle chinos") matches a product when every token
+    of the phrase appears in the product's tags.
+    """
+
+    def __init__(self, refresh_interval: float = 300):
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._listeners = []
+        self._reset()
+
+    def _reset(self):
+        self.products = {}  # id -> Product
+        self.by_token = defaultdict(set)
+        self.by_category = defaultdict(set)
+        self.by_color = defaultdict(set)
+        self.version = 0
+        self.loaded = False
+        self._last_sync = 0.0
+        self._all = ()
+        self._match_cache = {}
+        self._matrix = None
+
+    # ---------- mutation ----------
+
+    def _index(self, p):
+        self.products[p.id] = p
+        for token in tokenize(p.tags):
+            self.by_token[token].add(p.id)
+        self.by_category[(p.category or "").lower()].add(p.id)
+        self.by_color[(p.color or "").lower()].add(p.id)
+
+    def _unindex(self, product_id: str):
+        p = self.products.pop(product_id, None)
+        if p is None:
+            return
+        for token in tokenize(p.tags):
+            ids = self.by_token.get(token)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self.by_token[token]
+        self.by_category[(p.category or "").lower()].discard(product_id)
+        self.by_color[(p.color or "").lower()].discard(product_id)
+
+    def _changed(self):
+        self.version += 1
+        self._all = tuple(self.products.values())
+        self._match_cache = {}
+        for listener in self._listeners:
+            listener()
+
+    def on_change(self, listener):
+        """
+        Call listener() whenever the indexed catalog changes.
+        """
+        self._listeners.append(listener)
+
+    def load(self, products):
+        """
+        Replace the whole index with the given products.
+        """
+        with self._lock:
+            self._reset()
+            for p in products:
+                self._index(p)
+            self.loaded = True
+            self._last_sync = time.monotonic()
+            self._changed()
+
+    def upsert(self, products):
+        """
+        Add or replace products (e.g. right after they were written).
+        """
+        with self._lock:
+            for p in products:
+                self._unindex(p.id)
+                self._index(p)
+            self._changed()
+
+    def remove(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._unindex(product_id)
+            self._changed()
+
+    # ---------- syncing with the DB ----------
+
+    def load_from_db(self):
+        with get_session_sync() as session:
+            products = session.exec(select(Product)).all()
+        self.load(products)
+
+    def refresh(self):
+        """
+        Incremental sync: only ids are read, and only new rows are fetched.
+        Edits to existing rows must be pushed with upsert().
+        """
+        with get_session_sync() as session:
+            db_ids = set(session.exec(select(Product.id)).all())
+
+            with self._lock:
+                known = set(self.products)
+                new_ids = db_ids - known
+                gone_ids = known - db_ids
+
+                new_products = []
+                pending = list(new_ids)
+                for i in range(0, len(pending), 500):
+                    stmt = select(Product).where(Product.id.in_(pending[i:i + 500]))
+                    new_products.extend(session.exec(stmt).all())
+
+                for product_id in gone_ids:
+                    self._unindex(product_id)
+                for p in new_products:
+                    self._index(p)
+
+                self._last_sync = time.monotonic()
+                if new_ids or gone_ids:
+                    self._changed()
+
+    def ensure_fresh(self):
+        """
+        Load on first use, then refresh at most once per refresh_interval.
+        """
+        if not self.loaded:
+            with self._lock:
+                if not self.loaded:
+                    self.load_from_db()
+            return
+
+        if time.monotonic() - self._last_sync >= self.refresh_interval:
+            self.refresh()
+
+    # ---------- lookups ----------
+
+    def match_tag(self, tag: str):
+        """
+        Products matching one tag phrase.
+        """
+        cached = self._match_cache.get(tag)
+        if cached is not None:
+            return cached
+
+        tokens = tokenize(tag)
+        with self._lock:
+            if not tokens:
+                result = ()
+            else:
+                postings = sorted(
+                    (self.by_token.get(t, set()) for t in tokens), key=len
+                )
+                ids = set(postings[0]).intersection(*postings[1:])
+                result = tuple(self.products[i] for i in ids)
+            self._match_cache[tag] = result
+        return result
+
+    def match_any(self, tags: list[str]):
+        """
+        Products matching any of the tags, without duplicates.
+        """
+        if len(tags) == 1:
+            return list(self.match_tag(tags[0]))
+
+        seen = set()
+        results = []
+        for tag in tags:
+            for p in self.match_tag(tag):
+                if p.id not in seen:
+                    seen.add(p.id)
+                    results.append(p)
+        return results
+
+    def by_category_and_color(self, category: str = None, color: str = None):
+        with self._lock:
+            ids = None
+            if category is not None:
+                ids = set(self.by_category.get(category.lower(), set()))
+            if color is not None:
+                color_ids = self.by_color.get(color.lower(), set())
+                ids = set(color_ids) if ids is None else ids & color_ids
+            if ids is None:
+                return list(self._all)
+            return [self.products[i] for i in ids]
+
+    def matrix(self) -> CatalogMatrix:
+        """
+        Feature matrix of the current catalog version.
+        """
+        matrix = self._matrix
+        if matrix is not None and matrix[0] == self.version:
+            return matrix[1]
+        with self._lock:
+            if self._matrix is None or self._matrix[0] != self.version:
+                self._matrix = (self.version, CatalogMatrix(self._all, self.by_token))
+            return self._matrix[1]
+
+    def sample(self, k: int):
+        products = self._all
+        return random.sample(products, min(k, len(products)))
+
+    def __len__(self):
+        return len(self.products)
+
+
+catalog = CatalogIndex(refresh_interval=settings.CATALOG_REFRESH_SECONDS)
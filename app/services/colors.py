@@ -0,0 +1,158 @@
+"""
+Colour names and hex codes mapped to CIELAB.
+
+Palettes ("deep teal") and product colours ("navy") are free text; both
+are resolved to LAB here, so palette matching is a distance in a
+perceptual space instead of a string comparison. Names are looked up
+whole, then without a lightness modifier ("light navy" = navy, lighter),
+then by their last known word ("dark olive green" -> green, darker).
+"""
+
+import re
+
+import numpy as np
+
+
+# sRGB of the colour names used by the rules and the catalog
+NAMED_COLORS = {
+    "white": "#ffffff",
+    "ivory": "#fffff0",
+    "cream": "#fffdd0",
+    "black": "#000000",
+    "grey": "#808080",
+    "gray": "#808080",
+    "warm grey": "#8f877c",
+    "charcoal": "#36454f",
+    "silver": "#c0c0c0",
+    "navy": "#000080",
+    "midnight blue": "#191970",
+    "marine": "#042e60",
+    "blue": "#0000ff",
+    "sky blue": "#87ceeb",
+    "pastel blue": "#aec6cf",
+    "denim": "#1560bd",
+    "teal": "#008080",
+    "deep teal": "#00555a",
+    "turquoise": "#40e0d0",
+    "green": "#008000",
+    "forest green": "#228b22",
+    "emerald": "#50c878",
+    "olive": "#808000",
+    "sage": "#9caf88",
+    "khaki": "#c3b091",
+    "beige": "#f5f5dc",
+    "soft beige": "#e8dcc4",
+    "tan": "#d2b48c",
+    "camel": "#c19a6b",
+    "brown": "#7b4b2a",
+    "earth brown": "#7a5c3e",
+    "chocolate": "#4e2a1a",
+    "rust": "#b7410e",
+    "orange": "#ffa500",
+    "burnt orange": "#cc5500",
+    "mustard": "#ffdb58",
+    "yellow": "#ffff00",
+    "red": "#ff0000",
+    "maroon": "#800000",
+    "burgundy": "#800020",
+    "wine": "#722f37",
+    "pink": "#ffc0cb",
+    "rose": "#e7a1b0",
+    "purple": "#800080",
+    "lavender": "#e6e6fa",
+}
+
+# L* shift of a leading modifier ("light navy", "deep teal")
+LIGHTNESS_MODIFIERS = {
+    "light": 15, "pale": 20, "soft": 10, "pastel": 15,
+    "dark": -15, "deep": -15,
+}
+
+HEX_RE = re.compile(r"^#?([0-9a-f]{6})$")
+
+
+def srgb_to_lab(rgb):
+    """
+    sRGB (..., 3) in 0..255 to CIELAB (D65), vectorized.
+    """
+    c = np.asarray(rgb, dtype=np.float64) / 255.0
+    c = np.where(c > 0.04045, ((c + 0.055) / 1.055) ** 2.4, c / 12.92)
+    xyz = c @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041],
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([
+        116 * f[..., 1] - 16,
+        500 * (f[..., 0] - f[..., 1]),
+        200 * (f[..., 1] - f[..., 2]),
+    ], axis=-1)
+
+
+def hex_to_lab(value: str):
+    """
+    "#rrggbb" to an (L, a, b) tuple, or None.
+    """
+    match = HEX_RE.match((value or "").strip().lower())
+    if not match:
+        return None
+    h = match.group(1)
+    rgb = [int(h[i:i + 2], 16) for i in (0, 2, 4)]
+    return tuple(round(float(v), 2) for v in srgb_to_lab(rgb))
+
+
+_NAMES = list(NAMED_COLORS)
+_LAB = dict(zip(_NAMES, (
+    tuple(round(float(v), 2) for v in lab)
+    for lab in srgb_to_lab([
+        [int(NAMED_COLORS[n][i:i + 2], 16) for i in (1, 3, 5)] for n in _NAMES
+    ])
+)))
+
+
+def color_to_lab(text: str):
+    """
+    LAB of a colour name or hex code, or None when it is not known.
+    """
+    text = " ".join((text or "").lower().replace("-", " ").split())
+    if not text:
+        return None
+    if text in _LAB:
+        return _LAB[text]
+    lab = hex_to_lab(text)
+    if lab is not None:
+        return lab
+
+    words = text.split()
+    shift = LIGHTNESS_MODIFIERS.get(words[0], 0) if len(words) > 1 else 0
+    if shift:
+        words = words[1:]
+    base = None
+    for i in range(len(words)):
+        base = _LAB.get(" ".join(words[i:]))
+        if base is not None:
+            break
+    if base is None:
+        return None
+    L, a, b = base
+    return (round(min(100.0, max(0.0, L + shift)), 2), a, b)
+
+
+def palette_lab(palette):
+    """
+    (k, 3) LAB array of the palette colours that are known.
+    """
+    labs = [lab for lab in (color_to_lab(name) for name in palette) if lab is not None]
+    return np.asarray(labs, dtype=np.float32).reshape(-1, 3)
+
+
+def apply_color(product):
+    """
+    Store the LAB vector of product.color on the product (ingest time).
+    Unknown colours leave the columns empty.
+    """
+    lab = color_to_lab(product.color)
+    product.color_l, product.color_a, product.color_b = lab or (None, None, None)
+    return product
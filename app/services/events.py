@@ -0,0 +1,156 @@
+"""
+In-process pub/sub for "recommendation finished" notifications.
+
+Waiters are asyncio futures on the API event loop. Publishers (the
+processing pipeline) may run in any thread; results are handed over
+with call_soon_threadsafe.
+
+Jobs run by a worker process publish to that process's hub, which no
+request waits on. The pipeline therefore also writes a CompletionEvent
+row with its result, and CompletionFeed relays new rows to the API
+process's hub (one indexed query per EVENTS_NOTIFY_INTERVAL, only while
+requests are waiting).
+"""
+
+import asyncio
+import datetime
+import logging
+import threading
+from collections import defaultdict
+
+from sqlalchemy import delete, func
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.models import CompletionEvent
+from app.db.session import async_session_factory, get_session_sync
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionHub:
+    def __init__(self):
+        self._waiters = defaultdict(set)  # image_id -> {future}
+        self._lock = threading.Lock()
+
+    def subscribe(self, image_id: str):
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._waiters[image_id].add(future)
+        return future
+
+    def unsubscribe(self, image_id: str, future):
+        with self._lock:
+            waiters = self._waiters.get(image_id)
+            if waiters is not None:
+                waiters.discard(future)
+                if not waiters:
+                    del self._waiters[image_id]
+
+    def publish(self, image_id: str, status: str):
+        """
+        Wake every waiter for image_id; safe to call from any thread.
+        """
+        with self._lock:
+            waiters = self._waiters.pop(image_id, ())
+
+        for future in waiters:
+            future.get_loop().call_soon_threadsafe(_resolve, future, status)
+
+    def waiting(self):
+        with self._lock:
+            return sum(len(w) for w in self._waiters.values())
+
+
+def _resolve(future, status):
+    if not future.done():
+        future.set_result(status)
+
+
+def completion_event(image_id: str, status: str):
+    """
+    Row to add to the session that stores the result, so the notice is
+    committed together with it.
+    """
+    return CompletionEvent(image_id=image_id, status=status)
+
+
+class CompletionFeed:
+    """
+    Relays CompletionEvent rows written by any process to a hub.
+    """
+
+    PAGE_SIZE = 500
+
+    def __init__(self, hub: CompletionHub, interval: float):
+        self.hub = hub
+        self.interval = interval
+        self._task = None
+
+    async def _last_id(self):
+        async with async_session_factory() as session:
+            return (await session.exec(select(func.max(CompletionEvent.id)))).one() or 0
+
+    async def _relay(self, last_id: int):
+        while True:
+            async with async_session_factory() as session:
+                stmt = (
+                    select(CompletionEvent.id, CompletionEvent.image_id, CompletionEvent.status)
+                    .where(CompletionEvent.id > last_id)
+                    .order_by(CompletionEvent.id)
+                    .limit(self.PAGE_SIZE)
+                )
+                rows = (await session.exec(stmt)).all()
+            for row in rows:
+                self.hub.publish(row.image_id, row.status)
+            if rows:
+                last_id = rows[-1].id
+            if len(rows) < self.PAGE_SIZE:
+                return last_id
+
+    async def run(self):
+        last_id = None
+        while True:
+            await asyncio.sleep(self.interval)
+            # Idle: no query; the backlog is read once someone waits
+            if not self.hub.waiting() and last_id is not None:
+                continue
+            try:
+                if last_id is None:
+                    last_id = await self._last_id()
+                else:
+                    last_id = await self._relay(last_id)
+            except Exception:
+                logger.exception("Reading completion events failed")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def prune_completion_events(hours: int = None):
+    """
+    Drop completion events older than EVENTS_RETENTION_HOURS.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+        hours=hours or settings.EVENTS_RETENTION_HOURS
+    )
+    with get_session_sync() as session:
+        count = session.execute(
+            delete(CompletionEvent).where(CompletionEvent.created_at < cutoff)
+        ).rowcount
+        session.commit()
+    return count
+
+
+hub = CompletionHub()
+completion_feed = CompletionFeed(hub, settings.EVENTS_NOTIFY_INTERVAL)
@@ -0,0 +1,84 @@
+"""
+Extracted image features, cached by content hash.
+
+Repeat uploads of the same photo (same SHA-256) reuse the features of
+the first analysis instead of downloading it and running OpenCV again.
+An in-process TTLCache sits in front of the ImageFeatures table; rows
+are removed together with the R2 object by the cleanup job.
+"""
+
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.models import ImageFeatures
+from app.db.session import get_session_sync
+from app.services.cache import TTLCache
+
+
+features_cache = TTLCache(
+    maxsize=settings.FEATURE_CACHE_SIZE,
+    ttl=settings.FEATURE_CACHE_TTL
+)
+
+
+def storage_key(content_hash: str):
+    return f"uploads/sha256/{content_hash}"
+
+
+def get_features(content_hash: str):
+    """
+    Cached features for an image hash, or None.
+    """
+    return get_many_features([content_hash]).get(content_hash)
+
+
+def get_many_features(content_hashes: list):
+    """
+    {content_hash: features} for the hashes that were analysed before.
+    """
+    found = {}
+    missing = []
+    for h in content_hashes:
+        if not h:
+            continue
+        features = features_cache.get(h)
+        if features is None:
+            missing.append(h)
+        else:
+            found[h] = features
+
+    if missing:
+        with get_session_sync() as session:
+            stmt = select(ImageFeatures).where(ImageFeatures.content_hash.in_(missing))
+            for row in session.exec(stmt).all():
+                features_cache.set(row.content_hash, row.features)
+                found[row.content_hash] = row.features
+
+    return found
+
+
+def store_features(content_hash: str, features: dict):
+    """
+    Remember the features of an analysed image (first writer wins).
+    """
+    # {} means the image could not be decoded: don't pin that result
+    if not content_hash or not features:
+        return
+
+    features_cache.set(content_hash, features)
+
+    with get_session_sync() as session:
+        if session.get(ImageFeatures, content_hash) is not None:
+            return
+        session.add(ImageFeatures(content_hash=content_hash, features=features))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Stored concurrently by another worker
+            session.rollback()
+
+
+def forget_features(content_hashes: list):
+    for h in content_hashes:
+        features_cache.pop(h)
@@ -1,33 +1,58 @@
 import cv2
+import io
+import json
+import logging
 import numpy as np
-import tempfile
-import os
+import warnings
+from concurrent.futures import ThreadPoolExecutor
 from uuid import uuid4
+from sqlalchemy.exc import IntegrityError
 from sqlmodel import select
 import datetime
+from PIL import Image as PILImage
 
 from app.core.config import settings
+from app.core.metrics import BACKGROUND_TASKS, stage
 from app.db.session import get_session_sync
 from app.db.models import Image, Recommendation
-from app.services.storage import delete_object
-from app.services.rules_engine import generate_recommendations_for_features
-from app.services.recommender import map_templates_to_products
+from app.services.storage import download_bytes
+from app.services import analysis, results
+from app.services.features import get_features, get_many_features, store_features
+from app.services.events import completion_event, hub
+from app.services.recommender import recommend_outfits
 
-import boto3
-from botocore.client import Config
 
+logger = logging.getLogger(__name__)
 
 # Load OpenCV face detector
 HAAR_PATH = cv2.data.haarcascades + "haarcascade_frontalface_default.xml"
 face_cascade = cv2.CascadeClassifier(HAAR_PATH)
 
 
+UNKNOWN_SKIN_TONE = {"tone": "unknown", "hex": "#808080"}
+
+# Skin statistics are sampled from at most ~this many pixels per face
+# (a strided grid); more pixels don't move a trimmed mean noticeably
+SKIN_SAMPLE_PIXELS = 4096
+
+
 def bgr_to_hex(bgr):
     r, g, b = int(bgr[2]), int(bgr[1]), int(bgr[0])
     return "#{:02x}{:02x}{:02x}".format(r, g, b)
 
 
-def extract_skin_tone_from_face(img_bgr, face_box):
+def tone_bucket(lightness: float):
+    # Categorize into NON-OFFENSIVE buckets
+    if lightness >= 200:
+        return "very_light"
+    if lightness >= 150:
+        return "light"
+    if lightness >= 100:
+        return "medium"
+    return "dark"
+
+
+def face_roi(img_bgr, face_box, max_pixels: int = None):
     x, y, w, h = face_box
 
     # Crop a clean central region from the face (reduces errors)
@@ -38,30 +63,86 @@ def extract_skin_tone_from_face(img_bgr, face_box):
 
     roi = img_bgr[y0:y1, x0:x1]
 
-    if roi.size == 0:
-        return {"tone": "unknown", "hex": "#808080"}
+    # Large faces: sample a regular grid instead of every pixel
+    if max_pixels and roi.shape[0] * roi.shape[1] > max_pixels:
+        step = int(np.ceil(np.sqrt(roi.shape[0] * roi.shape[1] / max_pixels)))
+        roi = roi[::step, ::step]
+    return roi
 
-    # Convert to LAB space for lightness measurement
-    lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
-    L = lab[:, :, 0]
-    mean_light = np.mean(L)
 
-    # Categorize into NON-OFFENSIVE buckets
-    if mean_light >= 200:
-        tone = "very_light"
-    elif mean_light >= 150:
-        tone = "light"
-    elif mean_light >= 100:
-        tone = "medium"
-    else:
-        tone = "dark"
+def extract_skin_tones_many(batch, trim: float = None, max_pixels: int = SKIN_SAMPLE_PIXELS):
+    """
+    Skin tone for many faces at once; batch is [(img_bgr, [box, ...]), ...]
+    (one image with a group of faces, or many images).
+
+    Every face ROI is stacked into one pixel column, converted to LAB in a
+    single cvtColor call and reduced per face with bincount / reduceat.
+    The tone uses a trimmed mean of L (the darkest and brightest `trim`
+    share of pixels are dropped), and the hex colour averages the same
+    pixels, so highlights and shadows don't skew either. Faces larger
+    than max_pixels are sampled on a strided grid (0 = every pixel).
+    Returns one list of results per image, in box order.
+    """
+    trim = settings.SKIN_TONE_TRIM if trim is None else trim
+
+    results = [[dict(UNKNOWN_SKIN_TONE) for _ in boxes] for _, boxes in batch]
+    rois, slots = [], []
+    for i, (img, boxes) in enumerate(batch):
+        for j, box in enumerate(boxes):
+            roi = face_roi(img, box, max_pixels)
+            if roi.size:
+                rois.append(roi.reshape(-1, 3))
+                slots.append((i, j))
+
+    if not rois:
+        return results
+
+    lengths = np.array([len(r) for r in rois])
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    pixels = np.concatenate(rois)
+
+    # Convert to LAB space for lightness measurement (one call for all faces)
+    L = cv2.cvtColor(pixels[:, None, :], cv2.COLOR_BGR2LAB)[:, 0, 0]
+
+    # Per-face lightness histograms → quantile bins
+    n = len(rois)
+    owner = np.repeat(np.arange(n), lengths)
+    hist = np.bincount(owner * 256 + L, minlength=n * 256).reshape(n, 256)
+    cdf = hist.cumsum(axis=1)
+
+    def quantile_bin(q):
+        return (cdf < (lengths * q)[:, None]).sum(axis=1)
+
+    lo, median, hi = quantile_bin(trim), quantile_bin(0.5), quantile_bin(1 - trim)
+
+    # Trimmed means over the pixels whose L lies in [lo, hi] (never empty:
+    # the median bin is always inside)
+    keep = (L >= lo[owner]) & (L <= hi[owner])
+    kept = np.add.reduceat(keep, starts, dtype=np.int64)
+    trimmed_l = np.add.reduceat(L * keep, starts, dtype=np.int64) / kept
+    mean_l = np.add.reduceat(L, starts, dtype=np.int64) / lengths
+    colors = np.add.reduceat(pixels * keep[:, None], starts, axis=0, dtype=np.int64) / kept[:, None]
+
+    for k, (i, j) in enumerate(slots):
+        results[i][j] = {
+            "tone": tone_bucket(trimmed_l[k]),
+            "hex": bgr_to_hex(colors[k]),
+            "lightness": {
+                "mean": round(float(mean_l[k]), 1),
+                "trimmed_mean": round(float(trimmed_l[k]), 1),
+                "median": int(median[k]),
+            },
+        }
 
-    avg_color = roi.mean(axis=(0, 1))
+    return results
 
-    return {
-        "tone": tone,
-        "hex": bgr_to_hex(avg_color)
-    }
+
+def extract_skin_tones(img_bgr, face_boxes):
+    return extract_skin_tones_many([(img_bgr, face_boxes)])[0]
+
+
+def extract_skin_tone_from_face(img_bgr, face_box):
+    return extract_skin_tones(img_bgr, [face_box])[0]
 
 
 def estimate_body_bbox(img_bgr):
@@ -79,33 +160,75 @@ def estimate_body_bbox(img_bgr):
     return {"x": x, "y": y, "w": bw, "h": bh}
 
 
-def process_downloaded_image(local_path: str):
-    img = cv2.imread(local_path)
+def detect_faces(img_bgr, max_side: int = None):
+    """
+    Run the face cascade on a downscaled grayscale copy and map the
+    boxes back to full-resolution coordinates.
+    max_side=0 detects on the full-resolution frame.
+    """
+    if max_side is None:
+        max_side = settings.FACE_DETECT_MAX_SIDE
 
-    if img is None:
-        return {}
+    h, w = img_bgr.shape[:2]
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+
+    scale = 1.0
+    if max_side and max(h, w) > max_side:
+        scale = max_side / max(h, w)
+        gray = cv2.resize(
+            gray,
+            (max(1, round(w * scale)), max(1, round(h * scale))),
+            interpolation=cv2.INTER_AREA
+        )
 
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    # Keep the 50px full-res minimum, but never go below the 24px cascade window
+    min_face = max(24, round(50 * scale))
 
     faces = face_cascade.detectMultiScale(
-        gray, scaleFactor=1.1, minNeighbors=5, minSize=(50, 50)
+        gray, scaleFactor=1.1, minNeighbors=5, minSize=(min_face, min_face)
     )
 
+    if scale == 1.0:
+        return [tuple(int(v) for v in f) for f in faces]
+
+    boxes = []
+    for fx, fy, fw, fh in faces:
+        x = min(w - 1, int(round(fx / scale)))
+        y = min(h - 1, int(round(fy / scale)))
+        bw = min(w - x, int(round(fw / scale)))
+        bh = min(h - y, int(round(fh / scale)))
+        boxes.append((x, y, bw, bh))
+    return boxes
+
+
+def analyze_image(img, detect_max_side: int = None):
+    """
+    Extract styling features from a decoded BGR image.
+    Faces are detected on a downscaled copy; skin tone is always
+    sampled from the original pixels. Group photos list every face
+    (largest first) under "faces"; face_bbox / skin_tone describe the
+    largest one.
+    """
+    faces = detect_faces(img, detect_max_side)
+    faces = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)[:settings.MAX_FACES]
+
     features = {}
 
-    # If a face was found → extract skin tone
+    # If faces were found → extract all skin tones in one pass
     if len(faces) > 0:
-        face = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)[0]
-        features["face_bbox"] = {
-            "x": int(face[0]),
-            "y": int(face[1]),
-            "w": int(face[2]),
-            "h": int(face[3])
-        }
-        features["skin_tone"] = extract_skin_tone_from_face(img, face)
+        tones = extract_skin_tones(img, faces)
+        features["faces"] = [
+            {
+                "bbox": {"x": int(f[0]), "y": int(f[1]), "w": int(f[2]), "h": int(f[3])},
+                "skin_tone": tone
+            }
+            for f, tone in zip(faces, tones)
+        ]
+        features["face_bbox"] = features["faces"][0]["bbox"]
+        features["skin_tone"] = features["faces"][0]["skin_tone"]
     else:
         # Still work even if no face is detected
-        features["skin_tone"] = {"tone": "unknown", "hex": "#808080"}
+        features["skin_tone"] = dict(UNKNOWN_SKIN_TONE)
 
     # Estimate the body region
     features["body_bbox"] = estimate_body_bbox(img)
@@ -117,84 +240,305 @@ def process_downloaded_image(local_path: str):
     return features
 
 
-def process_image_task(image_id: str, s3_key: str, occasion: str):
+def image_pixels(data):
+    """
+    Width * height from the image header (nothing is decoded), or None
+    when the header can't be read.
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", PILImage.DecompressionBombWarning)
+            with PILImage.open(io.BytesIO(data)) as header:
+                width, height = header.size
+    except PILImage.DecompressionBombError:
+        return float("inf")
+    except Exception:
+        return None
+    return width * height
+
+
+def decode_image_bytes(data):
+    """
+    Decode an encoded image straight from memory (no temp file).
+    Images over MAX_IMAGE_PIXELS are refused before decoding: a few MB
+    of PNG can expand to gigabytes of pixels and kill the worker.
+    """
+    pixels = image_pixels(data)
+    if pixels is not None and pixels > settings.MAX_IMAGE_PIXELS:
+        logger.warning("Refusing to decode a %s pixel image", pixels)
+        return None
+
+    buf = np.frombuffer(memoryview(data), dtype=np.uint8)
+    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+
+
+def process_image_bytes(data, detect_max_side: int = None):
+    img = decode_image_bytes(data)
+
+    if img is None:
+        return {}
+
+    return analyze_image(img, detect_max_side)
+
+
+def process_downloaded_image(local_path: str, detect_max_side: int = None):
+    img = cv2.imread(local_path)
+
+    if img is None:
+        return {}
+
+    return analyze_image(img, detect_max_side)
+
+
+def mark_image_failed(image_id: str):
+    with get_session_sync() as session:
+        img = session.get(Image, image_id)
+        if img:
+            img.status = "failed"
+            session.add(img)
+            session.add(completion_event(image_id, "failed"))
+            session.commit()
+
+    hub.publish(image_id, "failed")
+
+
+def unfinished_image_ids(image_ids: list[str]):
+    """
+    Images that still need processing: no recommendation stored and not
+    marked failed. A re-run job (worker died after committing) skips the
+    others instead of storing their recommendation twice.
+    """
+    with get_session_sync() as session:
+        done = select(Recommendation.image_id).where(Recommendation.image_id.in_(image_ids))
+        stmt = select(Image.id).where(
+            Image.id.in_(image_ids),
+            Image.status != "failed",
+            Image.id.not_in(done)
+        )
+        return set(session.exec(stmt).all())
+
+
+def mark_processed(img_record):
+    img_record.status = "processed"
+    img_record.processed_at = datetime.datetime.utcnow()
+
+
+def apply_features(img_record, features: dict):
+    # Optional: save summary for quick access
+    img_record.skin_tone = features.get("skin_tone", {}).get("tone")
+    img_record.body_shape = json.dumps(features.get("body_bbox"))
+    img_record.proportions = str(features.get("image_ratio"))
+
+
+def run_image_pipeline(
+    image_id: str,
+    s3_key: str,
+    occasion: str,
+    data: bytes = None,
+    content_hash: str = None
+):
     """
     MAIN PIPELINE:
-    - Downloads the uploaded image
+    - Reuses the features of an identical earlier upload if known
+    - Else uses the uploaded bytes if still in memory, or downloads them
     - Process it using OpenCV
     - Saves extracted features to DB
     - Generates outfit recommendations
+    Raises on failure so the caller decides between retry and "failed".
     """
 
-    # STEP 1 — Download image from Cloudflare R2
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=settings.S3_ENDPOINT_URL,
-        aws_access_key_id=settings.S3_ACCESS_KEY,
-        aws_secret_access_key=settings.S3_SECRET_KEY,
-        config=Config(signature_version="s3v4")
-    )
-
-    temp = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-
-    try:
-        s3.download_file(settings.S3_BUCKET, s3_key, temp.name)
-    except Exception:
-        temp.close()
-        os.unlink(temp.name)
-
-        # Update DB → failed
-        with get_session_sync() as session:
-            img = session.get(Image, image_id)
-            if img:
-                img.status = "failed"
-                session.add(img)
-                session.commit()
-        return
+    # Same content analysed before → skip STEP 1 + 2
+    with stage("features_lookup"):
+        features = get_features(content_hash)
 
-    temp.close()
+    if features is None:
+        # STEP 1 — Download image from Cloudflare R2 (only if not passed in)
+        if data is None:
+            with stage("download"):
+                data = download_bytes(s3_key)
 
-    # STEP 2 — Extract features
-    features = process_downloaded_image(temp.name)
+        # STEP 2 — Extract features (in the analysis process pool)
+        with stage("extract"):
+            features = analysis.analyze_bytes(data)
+        store_features(content_hash, features)
 
     # STEP 3 — Save to database
-    with get_session_sync() as session:
+    with stage("save"), get_session_sync() as session:
         img_record = session.get(Image, image_id)
 
         if img_record:
-            img_record.status = "processed"
-            img_record.processed_at = datetime.datetime.utcnow()
-
-            # Optional: save summary for quick access
-            img_record.skin_tone = features.get("skin_tone", {}).get("tone")
-            img_record.body_shape = features.get("body_bbox", None)
-            img_record.proportions = str(features.get("image_ratio"))
-
+            apply_features(img_record, features)
             session.add(img_record)
             session.commit()
 
     # STEP 4 — Generate outfit recommendations
-    templates = generate_recommendations_for_features(features, occasion)
-
     # STEP 5 — Map templates to product picks
-    ranked = map_templates_to_products(templates)
+    # (ranked candidates cached per skin tone / occasion / proportion;
+    # timed as the "rules" and "map" stages inside recommend_outfits)
+    ranked = recommend_outfits(features, occasion)
 
-    # STEP 6 — Store recommendation record
-    with get_session_sync() as session:
+    # STEP 6 — Store recommendation record; the image counts as processed
+    # only once its recommendation is committed with it
+    with stage("store"), get_session_sync() as session:
+        img_record = session.get(Image, image_id)
+        if img_record:
+            mark_processed(img_record)
+            session.add(img_record)
         rec = Recommendation(
             id=str(uuid4()),
             image_id=image_id,
+            user_id=img_record.user_id if img_record else None,
             ranked_outfits=ranked,
             created_at=datetime.datetime.utcnow()
         )
         session.add(rec)
-        session.commit()
+        session.add(completion_event(image_id, "ready"))
+        try:
+            session.commit()
+        except IntegrityError:
+            # Stored by an earlier run of the same job
+            session.rollback()
+            logger.info("Recommendation for image %s already stored", image_id)
 
-    # Cleanup: delete temp file
-    try:
-        os.unlink(temp.name)
-    except:
-        pass
+    results.mark_ready(image_id)
+    hub.publish(image_id, "ready")
 
     # (Image will be deleted from R2 after 24 hours by cleanup job)
 
+
+def process_image_task(
+    image_id: str,
+    s3_key: str,
+    occasion: str,
+    data: bytes = None,
+    content_hash: str = None
+):
+    """
+    Inline (in-process) runner: a failed pipeline marks the image failed.
+    """
+    try:
+        with BACKGROUND_TASKS.labels("process_image").track_inprogress():
+            run_image_pipeline(image_id, s3_key, occasion, data, content_hash)
+    except Exception:
+        logger.exception("Processing failed for image %s", image_id)
+        mark_image_failed(image_id)
+
+
+class BatchIncomplete(Exception):
+    """
+    Some images of a batch failed; .errors maps image_id -> exception.
+    """
+
+    def __init__(self, errors: dict):
+        super().__init__(f"{len(errors)} image(s) failed: {sorted(errors)}")
+        self.errors = errors
+
+
+def pending_batch_items(items: list[dict]):
+    """
+    Items whose image has no recommendation yet (used on retries).
+    """
+    pending = unfinished_image_ids([it["image_id"] for it in items])
+    return [it for it in items if it["image_id"] in pending]
+
+
+def run_image_batch_pipeline(items: list[dict], occasion: str, data_by_id: dict = None):
+    """
+    Batch variant of run_image_pipeline for
+    [{"image_id", "s3_key", "content_hash"}, ...].
+    Images are analysed in parallel on the process pool, DB writes are
+    one transaction per step, and catalog lookups are shared through
+    the recommendation cache. Raises BatchIncomplete if any image failed.
+    """
+    data_by_id = dict(data_by_id or {})
+    errors = {}
+
+    # Images analysed before (same content hash) skip STEP 1 + 2
+    with stage("batch_features_lookup"):
+        known = get_many_features([it.get("content_hash") for it in items])
+    features_by_id = {
+        it["image_id"]: known[it["content_hash"]]
+        for it in items if it.get("content_hash") in known
+    }
+    todo = [it for it in items if it["image_id"] not in features_by_id]
+
+    # STEP 1 — Download images that are not in memory (concurrently)
+    missing = [it for it in todo if it["image_id"] not in data_by_id]
+    if missing:
+        with stage("batch_download"), ThreadPoolExecutor(max_workers=min(8, len(missing))) as pool:
+            futures = {
+                it["image_id"]: pool.submit(download_bytes, it["s3_key"]) for it in missing
+            }
+        for image_id, future in futures.items():
+            try:
+                data_by_id[image_id] = future.result()
+            except Exception as exc:
+                errors[image_id] = exc
+
+    # STEP 2 — Extract features for all images at once
+    todo = [it for it in todo if it["image_id"] in data_by_id]
+    with stage("batch_extract"):
+        analysed = analysis.analyze_many([data_by_id[it["image_id"]] for it in todo])
+    for it, result in zip(todo, analysed):
+        if isinstance(result, Exception):
+            errors[it["image_id"]] = result
+        else:
+            features_by_id[it["image_id"]] = result
+            store_features(it.get("content_hash"), result)
+
+    # STEP 3 — Save to database
+    with stage("batch_save"), get_session_sync() as session:
+        stmt = select(Image).where(Image.id.in_(list(features_by_id)))
+        for img_record in session.exec(stmt).all():
+            apply_features(img_record, features_by_id[img_record.id])
+            session.add(img_record)
+        session.commit()
+
+    # STEP 4 + 5 — Templates and product picks (shared candidate sets)
+    ranked_by_id = {
+        image_id: recommend_outfits(features, occasion)
+        for image_id, features in features_by_id.items()
+    }
+
+    # STEP 6 — Store recommendation records, marking their images processed
+    # in the same commit (a failure before this leaves them pending)
+    with stage("batch_store"), get_session_sync() as session:
+        now = datetime.datetime.utcnow()
+        stmt = select(Image).where(Image.id.in_(list(ranked_by_id)))
+        owners = {}
+        for img_record in session.exec(stmt).all():
+            mark_processed(img_record)
+            session.add(img_record)
+            owners[img_record.id] = img_record.user_id
+        session.add_all([
+            Recommendation(
+                id=str(uuid4()),
+                image_id=image_id,
+                user_id=owners.get(image_id),
+                ranked_outfits=ranked,
+                created_at=now
+            )
+            for image_id, ranked in ranked_by_id.items()
+        ])
+        session.add_all([completion_event(image_id, "ready") for image_id in ranked_by_id])
+        session.commit()
+
+    for image_id in ranked_by_id:
+        results.mark_ready(image_id)
+        hub.publish(image_id, "ready")
+
+    if errors:
+        raise BatchIncomplete(errors)
+
+
+def process_image_batch_task(items: list[dict], occasion: str, data_by_id: dict = None):
+    """
+    Inline runner for a batch: images that did not finish are marked failed.
+    """
+    try:
+        with BACKGROUND_TASKS.labels("process_image_batch").track_inprogress():
+            run_image_batch_pipeline(items, occasion, data_by_id)
+    except Exception:
+        logger.exception("Batch processing failed")
+        for it in pending_batch_items(items):
+            mark_image_failed(it["image_id"])
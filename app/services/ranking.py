@@ -0,0 +1,117 @@
+"""
+Product scoring for outfit slots.
+
+Every product of the catalog matrix is scored against a slot query in a
+few vectorized passes:
+
+    score = w_tags * tag overlap          (share of the phrase's tokens)
+          + w_category * category match   (product category == slot)
+          + w_color * palette match       (LAB distance to the palette)
+          + w_price * price band match    (occasion's price band)
+
+and the top k rows are taken with argpartition, so the cost is linear
+in catalog size with no per-product Python work.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from app.services.catalog import CatalogMatrix
+from app.services.colors import palette_lab
+
+
+DEFAULT_WEIGHTS = {"tags": 1.0, "category": 0.5, "color": 0.5, "price": 0.25}
+
+# CIELAB distance (delta E 1976) at which a colour stops counting as a palette match
+DEFAULT_COLOR_RADIUS = 40.0
+
+
+class SlotQuery(NamedTuple):
+    tag: str
+    category: str
+    palette: tuple
+    price_band: Optional[tuple] = None
+
+
+class Ranked(NamedTuple):
+    """
+    Top products of one query, best first, with their scores.
+    """
+    products: tuple
+    scores: np.ndarray
+
+
+def palette_match(matrix: CatalogMatrix, palette, radius: float = DEFAULT_COLOR_RADIUS):
+    """
+    1.0 for products in a palette colour, falling linearly to 0 at
+    `radius` from the nearest one; 0 for unknown colours.
+    """
+    targets = palette_lab(palette)
+    if not len(targets) or not len(matrix):
+        return np.zeros(len(matrix), dtype=np.float32)
+    # Distances are taken per distinct catalog colour, then spread to
+    # products by colour code
+    diff = matrix.lab_table[:, None, :] - targets[None, :, :]
+    nearest = np.sqrt((diff * diff).sum(axis=2)).min(axis=1)
+    match = np.nan_to_num(np.clip(1 - nearest / radius, 0, 1), nan=0.0)
+    return match.astype(np.float32)[matrix.color]
+
+
+def price_match(matrix: CatalogMatrix, band):
+    low, high = band
+    return ((matrix.price >= low) & (matrix.price <= high)).astype(np.float32)
+
+
+def category_match(matrix: CatalogMatrix, category: str):
+    code = matrix.categories.get(category.lower())
+    if code is None:
+        return np.zeros(len(matrix), dtype=np.float32)
+    return (matrix.category == code).astype(np.float32)
+
+
+def top_k(matrix: CatalogMatrix, scores: np.ndarray, k: int):
+    k = min(k, len(scores))
+    if k == 0:
+        return Ranked((), scores[:0])
+    rows = np.argpartition(-scores, k - 1)[:k]
+    # argsort is stable: equal scores keep catalog order
+    rows = rows[np.argsort(-scores[rows], kind="stable")]
+    return Ranked(tuple(matrix.products[i] for i in rows), scores[rows])
+
+
+def rank(matrix: CatalogMatrix, queries, k: int, weights: dict = None,
+         color_radius: float = DEFAULT_COLOR_RADIUS):
+    """
+    Top-k products per query, as {query: Ranked}.
+    The non-tag part of the score depends only on (category, palette,
+    price band), so it is computed once per distinct combination.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    n = len(matrix)
+    palettes, bands, bases = {}, {}, {}
+
+    results = {}
+    for q in set(queries):
+        base_key = (q.category, q.palette, q.price_band)
+        base = bases.get(base_key)
+        if base is None:
+            base = np.zeros(n, dtype=np.float32)
+            if weights["category"]:
+                base += weights["category"] * category_match(matrix, q.category)
+            if weights["color"] and q.palette:
+                if q.palette not in palettes:
+                    palettes[q.palette] = palette_match(matrix, q.palette, color_radius)
+                base += weights["color"] * palettes[q.palette]
+            if weights["price"] and q.price_band:
+                if q.price_band not in bands:
+                    bands[q.price_band] = price_match(matrix, q.price_band)
+                base += weights["price"] * bands[q.price_band]
+            bases[base_key] = base
+
+        scores = matrix.tag_overlap(q.tag)
+        scores *= weights["tags"]
+        scores += base
+        results[q] = top_k(matrix, scores, k)
+
+    return results
@@ -4,43 +4,146 @@ to real products from the database.
 """
 
 import random
-from sqlmodel import select
-from app.db.session import get_session_sync
-from app.db.models import Product
+from app.core.config import settings
+from app.core.metrics import stage
+from app.services.cache import TTLCache
+from app.services.catalog import catalog
+from app.services.ranking import SlotQuery, rank
+from app.services.rules_engine import rulebook, template_key
+
+
+# Ranked candidate sets per (rules version, skin tone, occasion,
+# proportion, catalog version). Ties are still broken at random per
+# request on top of the cached candidates.
+recommendation_cache = TTLCache(
+    maxsize=settings.RECOMMENDATION_CACHE_SIZE,
+    ttl=settings.RECOMMENDATION_CACHE_TTL
+)
+catalog.on_change(recommendation_cache.clear)
+rulebook.on_change(recommendation_cache.clear)
 
 
 def fetch_products_by_tags(tags: list[str]):
     """
     Fetches products whose tags match any of the desired tags.
     If no match found, returns random fallback items.
+    Served from the in-memory catalog index, not the DB.
     """
-    with get_session_sync() as session:
-        stmt = select(Product)
-        all_products = session.exec(stmt).all()
+    catalog.ensure_fresh()
 
-    # Filter products
-    results = []
-    for p in all_products:
-        for tag in tags:
-            if tag.lower() in p.tags.lower():
-                results.append(p)
-                break
+    results = catalog.match_any(tags)
 
     # If empty, fallback to random 10 products
     if not results:
-        random.shuffle(all_products)
-        return all_products[:10]
+        return catalog.sample(10)
 
     return results
 
 
-def pick_random_product(products):
+# Template keys that are not product slots
+TEMPLATE_META = ("recommended_colors", "price_band")
+
+
+def template_slots(template: dict):
+    """
+    Product slots of a template (top / bottom / shoes / ...).
+    Every key except the colour recommendation and price band is a slot;
+    a slot is matched against the product category of the same name.
+    """
+    return [k for k in template if k not in TEMPLATE_META]
+
+
+def slot_query(template: dict, slot: str):
+    return SlotQuery(
+        tag=template[slot],
+        category=slot,
+        palette=tuple(template["recommended_colors"]),
+        price_band=template.get("price_band")
+    )
+
+
+def build_candidate_sets(template_sets: list[list[dict]], rules=None):
     """
-    Return a random product from the list.
+    Rank the candidate products of every slot of every template.
+    All slot queries are scored together against the catalog matrix,
+    and queries shared by several templates are ranked once.
     """
+    catalog.ensure_fresh()
+    rules = rules or rulebook.current()
+
+    queries = [
+        slot_query(t, slot)
+        for templates in template_sets
+        for t in templates
+        for slot in template_slots(t)
+    ]
+    ranked = rank(
+        catalog.matrix(), queries, settings.RANKING_TOP_K, rules.weights, rules.color_radius
+    )
+
+    results = []
+    for templates in template_sets:
+        candidates = []
+        for t in templates:
+            block = {slot: ranked[slot_query(t, slot)] for slot in template_slots(t)}
+            block["recommended_colors"] = t["recommended_colors"]
+            candidates.append(block)
+        results.append(candidates)
+
+    return results
+
+
+def pick_ranked(ranked, used: set):
+    """
+    Best-scored product not in `used`, chosen at random among equal
+    scores; falls back to the best product when all were used.
+    """
+    products, scores = ranked
     if not products:
-        return None
-    return random.choice(products)
+        return None, 0.0
+
+    i = 0
+    while i < len(products):
+        j = i + 1
+        while j < len(products) and scores[j] == scores[i]:
+            j += 1
+        fresh = [p for p in products[i:j] if p.id not in used]
+        if fresh:
+            return random.choice(fresh), float(scores[i])
+        i = j
+
+    return products[0], float(scores[0])
+
+
+def pick_outfits(candidates: list[dict]):
+    """
+    Pick one product per slot from each candidate block, preferring
+    products not used yet in this recommendation (see pick_ranked), and
+    order the outfits by their total score.
+    """
+    used = set()
+    scored = []
+    for c in candidates:
+        block = {}
+        total = 0.0
+        for slot in template_slots(c):
+            product, score = pick_ranked(c[slot], used)
+            if product is not None:
+                used.add(product.id)
+            block[slot] = product
+            total += score
+        block["recommended_colors"] = c["recommended_colors"]
+        scored.append((total, block))
+
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return [convert_product_response(block) for _, block in scored]
+
+
+def map_template_sets_to_products(template_sets: list[list[dict]]):
+    """
+    Batched mapping for several recommendations at once.
+    """
+    return [pick_outfits(c) for c in build_candidate_sets(template_sets)]
 
 
 def map_templates_to_products(templates: list[dict]):
@@ -52,28 +155,33 @@ def map_templates_to_products(templates: list[dict]):
     - shoes product
     - color recommendation
     """
+    return map_template_sets_to_products([templates])[0]
 
-    final = []
 
-    for t in templates:
-        # Convert template to product search tags
-        tags_top = [t["top"]]
-        tags_bottom = [t["bottom"]]
-        tags_shoes = [t["shoes"]]
+def recommend_outfits(features: dict, occasion: str):
+    """
+    Templates + product picks for one image.
+    The rule templates depend only on skin tone, occasion and proportion
+    bucket, so their candidate sets are cached; the rules and catalog
+    versions in the key (and the on_change hooks) drop entries when the
+    rules file or the products change.
+    """
+    catalog.ensure_fresh()
 
-        # Fetch products
-        top_options = fetch_products_by_tags(tags_top)
-        bottom_options = fetch_products_by_tags(tags_bottom)
-        shoe_options = fetch_products_by_tags(tags_shoes)
+    with stage("rules"):
+        rules = rulebook.current()
+        template = template_key(features, occasion, rules)
+    key = (rules.version, *template, catalog.version)
 
-        final.append({
-            "top": pick_random_product(top_options),
-            "bottom": pick_random_product(bottom_options),
-            "shoes": pick_random_product(shoe_options),
-            "recommended_colors": t["recommended_colors"]
-        })
+    candidates = recommendation_cache.get(key)
+    if candidates is None:
+        templates = rules.templates[template]
+        with stage("map"):
+            candidates = build_candidate_sets([templates], rules)[0]
+        recommendation_cache.set(key, candidates)
 
-    return [convert_product_response(o) for o in final]
+    with stage("pick"):
+        return pick_outfits(candidates)
 
 
 def convert_product_response(block):
@@ -95,11 +203,6 @@ def convert_product_response(block):
             "link": p.link
         }
 
-    return {
-        "top": format_prod(block["top"]),
-        "bottom": format_prod(block["bottom"]),
-        "shoes": format_prod(block["shoes"]),
-        "recommended_colors": block["recommended_colors"]
-    }
-
-
+    response = {slot: format_prod(block[slot]) for slot in template_slots(block)}
+    response["recommended_colors"] = list(block["recommended_colors"])
+    return response
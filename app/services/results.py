@@ -0,0 +1,69 @@
+"""
+Read-side caches for GET /recommendations/{image_id}.
+
+- payload_cache: image_id -> (etag, serialized JSON body) of finished
+  recommendations. They never change once written.
+- pending_cache: short-lived negative cache for "still processing", so
+  tight polling loops don't hit the DB on every request.
+- owner_cache: image_id -> user_id for the ownership check (owners
+  never change).
+"""
+
+import hashlib
+import json
+
+from app.core.config import settings
+from app.services.cache import TTLCache
+
+
+payload_cache = TTLCache(
+    maxsize=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_CACHE_TTL
+)
+pending_cache = TTLCache(
+    maxsize=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_PENDING_TTL
+)
+owner_cache = TTLCache(
+    maxsize=settings.RESULT_CACHE_SIZE,
+    ttl=settings.RESULT_CACHE_TTL
+)
+
+
+def make_etag(body: bytes):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def serialize_recommendation(image_id: str, ranked_outfits):
+    """
+    Serialize once, cache the bytes + ETag, and return them.
+    """
+    body = json.dumps(
+        {"image_id": image_id, "recommendation": ranked_outfits},
+        separators=(",", ":")
+    ).encode()
+    etag = make_etag(body)
+
+    payload_cache.set(image_id, (etag, body))
+    pending_cache.pop(image_id)
+    return etag, body
+
+
+def etag_matches(if_none_match: str, etag: str):
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == "*" or candidate == etag:
+            return True
+    return False
+
+
+def mark_ready(image_id: str):
+    """
+    Called when a recommendation row is written: stop serving the
+    cached "still processing" answer for this image.
+    """
+    pending_cache.pop(image_id)
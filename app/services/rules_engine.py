@@ -4,86 +4,266 @@ Generates outfit templates based on:
 - skin tone (non-offensive bucket categories)
 - body proportions
 - occasion
+
+The rules live in a data file (rules.json next to this module, or
+RULES_FILE). It is compiled once into read-only tables, with the
+templates of every (tone, occasion, proportion) combination built up
+front, so a request is a dict lookup however many rules there are.
+The file is re-read when its mtime changes.
 """
 
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from types import MappingProxyType
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(__file__), "rules.json")
+
+# template slot -> occasion rule list it cycles through
+SLOTS = (("top", "tops"), ("bottom", "bottoms"), ("shoes", "shoes"))
+
+
+class RulesError(ValueError):
+    pass
+
+
+class CompiledRules:
+    """
+    Immutable, precomputed form of one rules file.
+    """
+
+    def __init__(self, raw: dict, version: str):
+        self.version = version
+
+        count = int(raw.get("outfits_per_recommendation", 5))
+        colors = int(raw.get("colors_per_outfit", 3))
+
+        self.palettes = MappingProxyType({
+            tone: tuple(palette) for tone, palette in raw["palettes"].items()
+        })
+        self.default_tone = raw.get("default_tone", "unknown")
+        if self.default_tone not in self.palettes:
+            raise RulesError(f"No palette for default tone {self.default_tone!r}")
+
+        self.occasions = MappingProxyType({
+            name: MappingProxyType({key: tuple(rules[key]) for _, key in SLOTS})
+            for name, rules in raw["occasions"].items()
+        })
+        # [min, max] price of the products picked for an occasion, if any
+        self.price_bands = MappingProxyType({
+            name: tuple(float(v) for v in rules["price_band"])
+            for name, rules in raw["occasions"].items() if rules.get("price_band")
+        })
+        for name, rules in self.occasions.items():
+            for _, key in SLOTS:
+                if not rules[key]:
+                    raise RulesError(f"Occasion {name!r} has no {key}")
+        self.default_occasion = raw.get("default_occasion", "Casual")
+        if self.default_occasion not in self.occasions:
+            raise RulesError(f"Unknown default occasion {self.default_occasion!r}")
+
+        # Buckets that prefer nothing would only repeat the default
+        # templates (and split the recommendation cache), so they are left out
+        buckets = [p for p in raw.get("proportions", ()) if any(p.get("prefer", {}).values())]
+
+        # (min image ratio, name), highest threshold first
+        self.proportions = tuple(sorted(
+            ((float(p["min_ratio"]), p["name"]) for p in buckets),
+            reverse=True
+        ))
+        self.default_proportion = raw.get("default_proportion", "unknown")
+        prefer = {p["name"]: p["prefer"] for p in buckets}
+        prefer.setdefault(self.default_proportion, {})
+        self.proportion_names = frozenset(prefer)
+
+        # Product ranking weights, see app.services.ranking
+        self.weights = MappingProxyType(
+            {k: float(v) for k, v in raw.get("scoring", {}).items()}
+        )
+        self.color_radius = float(raw.get("color_match_radius", 40))
+
+        templates = {}
+        for tone, palette in self.palettes.items():
+            recommended = palette[:colors]
+            for occasion, rules in self.occasions.items():
+                for proportion, preferred in prefer.items():
+                    templates[(tone, occasion, proportion)] = build_templates(
+                        rules, preferred, recommended, self.price_bands.get(occasion), count
+                    )
+        self.templates = MappingProxyType(templates)
+
+    def resolve(self, tone: str, occasion: str, proportion: str):
+        """
+        Canonical (tone, occasion, proportion) key, with the configured
+        fallbacks for values the rules do not know.
+        """
+        if tone not in self.palettes:
+            tone = self.default_tone
+        if occasion not in self.occasions:
+            occasion = self.default_occasion
+        if proportion not in self.proportion_names:
+            proportion = self.default_proportion
+        return tone, occasion, proportion
+
+    def proportion_bucket(self, features: dict):
+        """
+        Proportion bucket of the photo's height / width ratio.
+        """
+        ratio = features.get("image_ratio")
+        if ratio is None:
+            return self.default_proportion
+        for min_ratio, name in self.proportions:
+            if ratio >= min_ratio:
+                return name
+        return self.default_proportion
+
+
+def build_templates(rules, preferred: dict, recommended: tuple, price_band, count: int):
+    """
+    `count` templates cycling through each slot's options; options the
+    proportion bucket prefers come first.
+    """
+    options = {}
+    for slot, key in SLOTS:
+        liked = set(preferred.get(key, ()))
+        options[slot] = sorted(rules[key], key=lambda item: item not in liked)
+
+    templates = []
+    for i in range(count):
+        template = {slot: items[i % len(items)] for slot, items in options.items()}
+        template["recommended_colors"] = recommended
+        template["price_band"] = price_band
+        templates.append(MappingProxyType(template))
+    return tuple(templates)
+
+
+def compile_rules(data: bytes):
+    """
+    Parse and precompute a rules file's contents.
+    """
+    try:
+        return CompiledRules(json.loads(data), hashlib.sha256(data).hexdigest()[:12])
+    except (KeyError, TypeError, ValueError) as exc:
+        raise RulesError(f"Invalid rules file: {exc!r}") from exc
+
+
+class RuleBook:
+    """
+    The current CompiledRules of a file, re-read when its mtime changes
+    (checked at most every reload_interval seconds; 0 = never).
+    A broken edit is logged and the previous rules stay in use.
+    """
+
+    def __init__(self, path: str, reload_interval: float = 5):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._listeners = []
+        self._rules = None
+        self._mtime = None  # of the loaded rules
+        self._bad_mtime = None  # of the last edit that failed to compile
+        self._last_check = 0.0
+
+    def on_change(self, listener):
+        """
+        Call listener() whenever a new rules version is loaded.
+        """
+        self._listeners.append(listener)
+
+    def _load(self):
+        """
+        (Re)load the file if it changed. Raises on a broken file; with no
+        rules loaded yet, every call tries again.
+        """
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime == self._mtime:
+            return
+        # A broken edit is reported once, not on every check
+        if self._rules is not None and mtime == self._bad_mtime:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                rules = compile_rules(f.read())
+        except (OSError, RulesError):
+            self._bad_mtime = mtime
+            raise
+        self._mtime = mtime
+        if self._rules is not None and rules.version == self._rules.version:
+            return
+        self._rules = rules
+        logger.info("Loaded rules %s from %s", rules.version, self.path)
+        for listener in self._listeners:
+            listener()
+
+    def current(self) -> CompiledRules:
+        rules = self._rules
+        if rules is not None and (
+            not self.reload_interval
+            or time.monotonic() - self._last_check < self.reload_interval
+        ):
+            return rules
+
+        with self._lock:
+            if self._rules is None:
+                self._load()
+            elif time.monotonic() - self._last_check >= self.reload_interval:
+                try:
+                    self._load()
+                except (OSError, RulesError):
+                    logger.exception("Reloading %s failed; keeping rules %s",
+                                     self.path, self._rules.version)
+            self._last_check = time.monotonic()
+            return self._rules
+
+
+rulebook = RuleBook(
+    settings.RULES_FILE or DEFAULT_RULES_FILE,
+    reload_interval=settings.RULES_RELOAD_SECONDS
+)
+
+
 def skin_tone_palette(tone: str):
     """
     Returns color families that flatter each skin tone,
     based on global fashion guidelines.
     NEVER uses offensive wording.
     """
-    palettes = {
-        "very_light": ["soft beige", "pastel blue", "sage", "rose", "light navy"],
-        "light": ["olive", "earth brown", "sky blue", "warm grey", "marine"],
-        "medium": ["forest green", "rust", "charcoal", "navy", "deep teal"],
-        "dark": ["burgundy", "emerald", "mustard", "midnight blue", "burnt orange"],
-        "unknown": ["black", "white", "navy", "grey"]  # universal safe palette
-    }
-    return palettes.get(tone, palettes["unknown"])
+    rules = rulebook.current()
+    return rules.palettes.get(tone, rules.palettes[rules.default_tone])
 
 
 def occasion_rules(occasion: str):
     """
     Defines silhouette + item guidelines based on user-selected occasion.
     """
-    rules = {
-        "Office": {
-            "tops": ["structured shirt", "tailored blouse", "light knit"],
-            "bottoms": ["straight trousers", "ankle chinos", "pencil skirt"],
-            "shoes": ["loafers", "minimal sneakers", "formal flats"],
-        },
-        "Date": {
-            "tops": ["soft knit", "fitted tee", "light blouse"],
-            "bottoms": ["slim jeans", "flow skirt", "straight trousers"],
-            "shoes": ["clean sneakers", "ankle boots", "loafers"]
-        },
-        "Party": {
-            "tops": ["bold shirt", "satin top", "statement tee"],
-            "bottoms": ["black jeans", "relaxed trousers", "mini skirt"],
-            "shoes": ["boots", "chunky sneakers", "dress shoes"]
-        },
-        "Casual": {
-            "tops": ["crew tee", "relaxed shirt", "hoodie"],
-            "bottoms": ["jeans", "cargo pants", "joggers"],
-            "shoes": ["sneakers", "slip-ons"]
-        },
-        "Wedding Guest": {
-            "tops": ["dress shirt", "festive kurta", "light blazer"],
-            "bottoms": ["formal trousers", "ethnic bottom"],
-            "shoes": ["formal shoes", "mojaris"]
-        },
-        "Travel": {
-            "tops": ["overshirt", "graphic tee", "sweatshirt"],
-            "bottoms": ["travel joggers", "cargo pants", "shorts"],
-            "shoes": ["comfortable sneakers", "slip-ons"]
-        }
-    }
-    return rules.get(occasion, rules["Casual"])  # fallback
+    rules = rulebook.current()
+    return rules.occasions.get(occasion, rules.occasions[rules.default_occasion])
+
+
+def template_key(features: dict, occasion: str, rules: CompiledRules = None):
+    """
+    (tone, occasion, proportion) the templates of these features are
+    keyed by; equal keys get identical templates.
+    """
+    rules = rules or rulebook.current()
+    tone = features.get("skin_tone", {}).get("tone", "unknown")
+    return rules.resolve(tone, occasion, rules.proportion_bucket(features))
 
 
 def generate_recommendations_for_features(features: dict, occasion: str):
     """
     MAIN RULE ENGINE
-    Creates 5 outfit templates using:
+    Returns the precomputed outfit templates (read-only) for:
     - skin tone palette
     - occasion rules
     - proportions
     """
-
-    tone = features.get("skin_tone", {}).get("tone", "unknown")
-    color_palette = skin_tone_palette(tone)
-
-    occ_rules = occasion_rules(occasion)
-
-    # Create 5 outfit templates
-    templates = []
-    for i in range(5):
-        templates.append({
-            "top": occ_rules["tops"][i % len(occ_rules["tops"])],
-            "bottom": occ_rules["bottoms"][i % len(occ_rules["bottoms"])],
-            "shoes": occ_rules["shoes"][i % len(occ_rules["shoes"])],
-            "recommended_colors": color_palette[:3]  # top 3 colors
-        })
-
-    return templates
-
+    rules = rulebook.current()
+    return rules.templates[template_key(features, occasion, rules)]
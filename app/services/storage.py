@@ -1,21 +1,73 @@
+import asyncio
+import functools
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
 from botocore.client import Config
 from app.core.config import settings
+from app.core.metrics import STORAGE_SECONDS
+
+# One shared, connection-pooled S3 client for Cloudflare R2.
+# boto3 clients are thread-safe once built, so every thread reuses it.
+_client = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client
 
-# Initialize S3 client for Cloudflare R2
-s3 = boto3.client(
-    "s3",
-    endpoint_url=settings.S3_ENDPOINT_URL,
-    aws_access_key_id=settings.S3_ACCESS_KEY,
-    aws_secret_access_key=settings.S3_SECRET_KEY,
-    config=Config(signature_version="s3v4")
-)
+    if _client is None:
+        with _lock:
+            if _client is None:
+                session = boto3.session.Session()
+                _client = session.client(
+                    "s3",
+                    endpoint_url=settings.S3_ENDPOINT_URL,
+                    aws_access_key_id=settings.S3_ACCESS_KEY,
+                    aws_secret_access_key=settings.S3_SECRET_KEY,
+                    config=Config(
+                        signature_version="s3v4",
+                        max_pool_connections=settings.S3_MAX_POOL_CONNECTIONS,
+                        connect_timeout=settings.S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.S3_READ_TIMEOUT,
+                        retries={"max_attempts": settings.S3_MAX_ATTEMPTS, "mode": "standard"},
+                        tcp_keepalive=True
+                    )
+                )
+    return _client
 
+
+def _get_executor():
+    """
+    Threads for the async API; sized to the connection pool so every
+    in-flight call has a connection.
+    """
+    global _executor
+
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.S3_MAX_POOL_CONNECTIONS,
+                    thread_name_prefix="storage"
+                )
+    return _executor
+
+
+async def _run(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), functools.partial(fn, *args, **kwargs))
+
+
+@STORAGE_SECONDS.labels("upload").time()
 def upload_bytes(key: str, data: bytes, content_type: str = "image/jpeg"):
     """
     Upload raw bytes to Cloudflare R2 storage.
     """
-    s3.put_object(
+    get_client().put_object(
         Bucket=settings.S3_BUCKET,
         Key=key,
         Body=data,
@@ -24,18 +76,65 @@ def upload_bytes(key: str, data: bytes, content_type: str = "image/jpeg"):
     )
     return key
 
+@STORAGE_SECONDS.labels("download").time()
+def download_bytes(key: str, chunk_size: int = 256 * 1024):
+    """
+    Stream an object from Cloudflare R2 into memory.
+    """
+    obj = get_client().get_object(Bucket=settings.S3_BUCKET, Key=key)
+    buf = io.BytesIO()
+    for chunk in obj["Body"].iter_chunks(chunk_size):
+        buf.write(chunk)
+    return buf.getvalue()
+
+@STORAGE_SECONDS.labels("delete").time()
 def delete_object(key: str):
     """
     Permanently delete file from Cloudflare R2.
     """
-    s3.delete_object(Bucket=settings.S3_BUCKET, Key=key)
+    get_client().delete_object(Bucket=settings.S3_BUCKET, Key=key)
+
+@STORAGE_SECONDS.labels("delete_batch").time()
+def delete_objects(keys: list[str]):
+    """
+    Bulk-delete up to 1000 keys per request.
+    Returns the keys that could not be deleted.
+    """
+    failed = []
+    for i in range(0, len(keys), 1000):
+        chunk = keys[i:i + 1000]
+        resp = get_client().delete_objects(
+            Bucket=settings.S3_BUCKET,
+            Delete={"Objects": [{"Key": k} for k in chunk], "Quiet": True}
+        )
+        failed.extend(err["Key"] for err in resp.get("Errors", []))
+    return failed
 
 def generate_presigned_url(key: str, expires_in=3600):
     """
     Generate a temporary URL so frontend can view images securely.
     """
-    return s3.generate_presigned_url(
+    return get_client().generate_presigned_url(
         ClientMethod="get_object",
         Params={"Bucket": settings.S3_BUCKET, "Key": key},
         ExpiresIn=expires_in
     )
+
+
+# ---------- async API (does not block the event loop) ----------
+
+async def upload_bytes_async(key: str, data: bytes, content_type: str = "image/jpeg"):
+    return await _run(upload_bytes, key, data, content_type=content_type)
+
+async def download_bytes_async(key: str):
+    return await _run(download_bytes, key)
+
+async def delete_object_async(key: str):
+    return await _run(delete_object, key)
+
+async def delete_objects_async(keys: list[str]):
+    return await _run(delete_objects, keys)
+
+async def generate_presigned_url_async(key: str, expires_in=3600):
+    # Presigning is local signing work, no network round trip
+    return generate_presigned_url(key, expires_in)
@@ -0,0 +1,96 @@
+"""
+Chunked reading of uploaded images.
+
+Uploads are read in UPLOAD_CHUNK_SIZE pieces from Starlette's spooled
+copy of the multipart body and rejected once they cross the size limit.
+The image type is sniffed from the magic bytes of the first chunk (the
+client's content_type is not trusted), and a SHA-256 of the content is
+computed while reading.
+
+By the time a handler runs, Starlette has already received the whole
+body (in memory up to 1 MB, then in a temp file), so the check here
+bounds what is copied into memory, not what the client may send. Only
+the Content-Length check in app.main refuses an upload early; chunked
+requests without Content-Length are always received in full first.
+"""
+
+import hashlib
+from typing import NamedTuple
+
+from app.core.config import settings
+
+
+class UploadRejected(Exception):
+    pass
+
+
+class UploadTooLarge(UploadRejected):
+    pass
+
+
+class UnsupportedImage(UploadRejected):
+    pass
+
+
+class StreamedUpload(NamedTuple):
+    data: bytearray
+    sha256: str
+    content_type: str
+    size: int
+
+
+def sniff_image_type(head: bytes):
+    """
+    Content type from the file signature, or None if not a known image.
+    """
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    return None
+
+
+async def read_image_stream(upload, limit: int = None, chunk_size: int = None):
+    """
+    Read an UploadFile chunk by chunk, validating as we go.
+    Holds at most limit + one chunk of the upload in memory (plus the
+    spooled body Starlette keeps). The returned data is the read buffer
+    itself, not a copy.
+    """
+    limit = limit or settings.MAX_IMAGE_SIZE_BYTES
+    chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+
+    hasher = hashlib.sha256()
+    buf = bytearray()
+    content_type = None
+
+    while True:
+        chunk = await upload.read(chunk_size)
+        if not chunk:
+            break
+
+        if content_type is None:
+            # Signatures fit in the first 12 bytes
+            while len(chunk) < 12:
+                more = await upload.read(12 - len(chunk))
+                if not more:
+                    break
+                chunk += more
+            content_type = sniff_image_type(chunk)
+            if content_type is None:
+                raise UnsupportedImage("Not a supported image format")
+
+        if len(buf) + len(chunk) > limit:
+            raise UploadTooLarge("File too large")
+
+        hasher.update(chunk)
+        buf += chunk
+
+    if content_type is None:
+        raise UnsupportedImage("Empty upload")
+
+    return StreamedUpload(buf, hasher.hexdigest(), content_type, len(buf))
@@ -1,46 +1,120 @@
 import datetime
+import logging
+import time
 from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import and_, delete, or_
 from sqlmodel import select
 
 from app.db.session import get_session_sync
-from app.db.models import Image
-from app.services.storage import delete_object
+from app.db.models import Image, ImageFeatures
+from app.services.events import prune_completion_events
+from app.services.features import forget_features
+from app.services.storage import delete_objects
 from app.core.config import settings
 
+logger = logging.getLogger(__name__)
 
-def cleanup_expired_images():
+
+def cleanup_expired_images(batch_size: int = None):
     """
     Deletes images older than configured retention time
     from Cloudflare R2 and marks database accordingly.
+
+    Expired rows are streamed in pages of batch_size (keyset paging on
+    uploaded_at, id). Each page is one S3 delete_objects call, one SQL
+    DELETE and one commit. Rows whose object could not be deleted are
+    kept and retried on the next run.
+
+    Keys are content-addressed, so an object (and its cached features)
+    is only deleted once no non-expired image references the same hash.
     """
 
+    batch_size = min(batch_size or settings.CLEANUP_BATCH_SIZE, 1000)
+
     cutoff = datetime.datetime.utcnow() - datetime.timedelta(
         hours=settings.IMAGE_RETENTION_HOURS
     )
 
-    with get_session_sync() as session:
-        stmt = select(Image).where(Image.uploaded_at < cutoff)
-        old_images = session.exec(stmt).all()
+    stats = {"deleted": 0, "failed": 0, "batches": 0}
+    started = time.perf_counter()
+    last = None
+
+    while True:
+        with get_session_sync() as session:
+            stmt = (
+                select(Image.id, Image.s3_key, Image.content_hash, Image.uploaded_at)
+                .where(Image.uploaded_at < cutoff)
+            )
+            if last is not None:
+                stmt = stmt.where(or_(
+                    Image.uploaded_at > last[0],
+                    and_(Image.uploaded_at == last[0], Image.id > last[1])
+                ))
+            stmt = stmt.order_by(Image.uploaded_at, Image.id).limit(batch_size)
+            rows = session.exec(stmt).all()
 
-        for img in old_images:
+            if not rows:
+                break
+            last = (rows[-1].uploaded_at, rows[-1].id)
+
+            # photos re-uploaded within the retention window keep their object
+            hashes = {r.content_hash for r in rows if r.content_hash}
+            retained = set()
+            if hashes:
+                retained = set(session.exec(
+                    select(Image.content_hash).where(
+                        Image.content_hash.in_(list(hashes)),
+                        Image.uploaded_at >= cutoff
+                    ).distinct()
+                ).all())
+
+            # delete files from R2 in one request
+            keys = sorted({r.s3_key for r in rows if r.content_hash not in retained})
             try:
-                # delete file from R2
-                delete_object(img.s3_key)
-            except:
-                pass
+                failed = set(delete_objects(keys)) if keys else set()
+            except Exception:
+                logger.exception("R2 batch delete failed")
+                failed = set(keys)
+
+            # update DB with set-based DELETEs
+            done_ids = [r.id for r in rows if r.s3_key not in failed]
+            gone = list({
+                r.content_hash for r in rows
+                if r.content_hash and r.content_hash not in retained and r.s3_key not in failed
+            })
+            if done_ids:
+                session.execute(delete(Image).where(Image.id.in_(done_ids)))
+            if gone:
+                session.execute(
+                    delete(ImageFeatures).where(ImageFeatures.content_hash.in_(gone))
+                )
+            session.commit()
+            forget_features(gone)
 
-            # update DB
-            session.delete(img)
+        stats["batches"] += 1
+        stats["deleted"] += len(done_ids)
+        stats["failed"] += len(rows) - len(done_ids)
+
+    stats["seconds"] = round(time.perf_counter() - started, 3)
+    stats["images_per_second"] = (
+        round(stats["deleted"] / stats["seconds"], 1) if stats["seconds"] else 0.0
+    )
 
-        session.commit()
+    if stats["batches"]:
+        logger.info(
+            "Image cleanup: deleted=%(deleted)s failed=%(failed)s batches=%(batches)s "
+            "seconds=%(seconds)s rate=%(images_per_second)s/s", stats
+        )
+    return stats
 
 
 def start_scheduler():
     """
-    Runs every 1 hour to delete old images.
+    Runs every 1 hour to delete old images and completion events.
     """
     scheduler = BackgroundScheduler()
     scheduler.add_job(cleanup_expired_images, "interval", hours=1)
+    scheduler.add_job(prune_completion_events, "interval", hours=1)
     scheduler.start()
 
 
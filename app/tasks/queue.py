@@ -0,0 +1,257 @@
+"""
+Durable job queue stored in the app database.
+
+The API only enqueues; app.tasks.worker processes claim and run jobs.
+Jobs survive restarts, are retried with exponential backoff and are
+served by priority lane (high → default → bulk). A running job holds a
+lease its worker renews (heartbeat); a job whose lease runs out is
+re-queued, or failed once its attempts are used up.
+"""
+
+import datetime
+import random
+import traceback
+from uuid import uuid4
+
+from sqlalchemy import func, update
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.session import get_session_sync
+from app.db.models import Job
+
+
+LANES = {"high": 0, "default": 10, "bulk": 20}
+
+
+def new_job(kind: str, payload: dict, lane: str = "default", max_attempts: int = None):
+    """
+    Build a Job row; add it to a session yourself to enqueue it in the
+    same transaction as other writes (e.g. the Image row).
+    """
+    if lane not in LANES:
+        raise ValueError(f"Unknown lane: {lane}")
+
+    now = datetime.datetime.utcnow()
+    return Job(
+        id=str(uuid4()),
+        kind=kind,
+        payload=payload,
+        lane=lane,
+        priority=LANES[lane],
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        run_after=now,
+        enqueued_at=now
+    )
+
+
+def enqueue(kind: str, payload: dict, lane: str = "default", max_attempts: int = None):
+    job = new_job(kind, payload, lane, max_attempts)
+    job_id = job.id
+    with get_session_sync() as session:
+        session.add(job)
+        session.commit()
+    return job_id
+
+
+def claim(worker_id: str, lanes: list[str] = None):
+    """
+    Atomically take the next runnable job, or return None.
+    """
+    now = datetime.datetime.utcnow()
+
+    with get_session_sync() as session:
+        for _ in range(5):
+            stmt = (
+                select(Job.id)
+                .where(Job.status == "queued", Job.run_after <= now)
+                .order_by(Job.priority, Job.run_after)
+                .limit(1)
+            )
+            if lanes:
+                stmt = stmt.where(Job.lane.in_(lanes))
+
+            job_id = session.exec(stmt).first()
+            if job_id is None:
+                return None
+
+            # Only one worker wins the queued → running transition
+            claimed = session.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == "queued")
+                .values(
+                    status="running",
+                    locked_by=worker_id,
+                    started_at=now,
+                    heartbeat_at=now,
+                    attempts=Job.attempts + 1
+                )
+            ).rowcount
+            session.commit()
+
+            if claimed:
+                return session.get(Job, job_id)
+
+    return None
+
+
+def complete(job_id: str):
+    with get_session_sync() as session:
+        job = session.get(Job, job_id)
+        job.status = "done"
+        job.finished_at = datetime.datetime.utcnow()
+        job.locked_by = None
+        session.add(job)
+        session.commit()
+
+
+def retry_delay(attempts: int):
+    """
+    Exponential backoff with jitter, capped at JOB_RETRY_BACKOFF_MAX.
+    """
+    delay = settings.JOB_RETRY_BACKOFF * (2 ** max(0, attempts - 1))
+    return min(settings.JOB_RETRY_BACKOFF_MAX, delay) * random.uniform(0.8, 1.2)
+
+
+def fail(job_id: str, error: BaseException):
+    """
+    Re-queue with backoff, or mark failed once attempts are used up.
+    Returns True when the job will be retried.
+    """
+    now = datetime.datetime.utcnow()
+
+    with get_session_sync() as session:
+        job = session.get(Job, job_id)
+        job.last_error = "".join(traceback.format_exception_only(type(error), error)).strip()
+        job.locked_by = None
+
+        retry = job.attempts < job.max_attempts
+        if retry:
+            job.status = "queued"
+            job.run_after = now + datetime.timedelta(seconds=retry_delay(job.attempts))
+        else:
+            job.status = "failed"
+            job.finished_at = now
+
+        session.add(job)
+        session.commit()
+    return retry
+
+
+def heartbeat(job_ids):
+    """
+    Renew the lease of running jobs.
+    """
+    if not job_ids:
+        return
+    with get_session_sync() as session:
+        session.execute(
+            update(Job)
+            .where(Job.id.in_(list(job_ids)), Job.status == "running")
+            .values(heartbeat_at=datetime.datetime.utcnow())
+        )
+        session.commit()
+
+
+def requeue_stale(lease_seconds: float = None):
+    """
+    Put back jobs whose worker died mid-run (no heartbeat within the
+    lease). Jobs that used up their attempts (e.g. one that kills its
+    worker every time) are marked failed instead.
+    Returns (re-queued count, failed jobs).
+    """
+    now = datetime.datetime.utcnow()
+    lease = lease_seconds or settings.JOB_LEASE_SECONDS
+    cutoff = now - datetime.timedelta(seconds=lease)
+    stale = (
+        Job.status == "running",
+        func.coalesce(Job.heartbeat_at, Job.started_at) < cutoff
+    )
+
+    with get_session_sync() as session:
+        exhausted = session.exec(
+            select(Job.id).where(*stale, Job.attempts >= Job.max_attempts)
+        ).all()
+
+        failed_ids = []
+        for job_id in exhausted:
+            # Guarded per row: only one worker fails (and reports) a job
+            if session.execute(
+                update(Job)
+                .where(Job.id == job_id, *stale)
+                .values(
+                    status="failed",
+                    finished_at=now,
+                    locked_by=None,
+                    last_error="Worker lost: lease expired on the last attempt"
+                )
+                .execution_options(synchronize_session=False)
+            ).rowcount:
+                failed_ids.append(job_id)
+
+        count = session.execute(
+            update(Job)
+            .where(*stale, Job.attempts < Job.max_attempts)
+            .values(status="queued", locked_by=None)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        session.commit()
+
+        failed = [session.get(Job, job_id) for job_id in failed_ids]
+    return count, failed
+
+
+def depth():
+    """
+    {(lane, status): job count}; one GROUP BY, cheap enough per scrape.
+    """
+    with get_session_sync() as session:
+        rows = session.exec(
+            select(Job.lane, Job.status, func.count()).group_by(Job.lane, Job.status)
+        ).all()
+    return {(lane, status): count for lane, status, count in rows}
+
+
+def stats(window_seconds: float = 300):
+    """
+    Queue depth per lane / status, plus wait and processing times of
+    jobs finished within the last window_seconds.
+    """
+    now = datetime.datetime.utcnow()
+    since = now - datetime.timedelta(seconds=window_seconds)
+
+    counts = depth()
+
+    with get_session_sync() as session:
+        oldest = session.exec(
+            select(func.min(Job.enqueued_at)).where(Job.status == "queued")
+        ).one()
+        recent = session.exec(
+            select(Job.enqueued_at, Job.started_at, Job.finished_at)
+            .where(Job.status == "done", Job.finished_at >= since)
+            .limit(5000)
+        ).all()
+
+    by_lane = {lane: {} for lane in LANES}
+    for (lane, status), count in counts.items():
+        by_lane.setdefault(lane, {})[status] = count
+
+    waits = sorted((r.started_at - r.enqueued_at).total_seconds() for r in recent)
+    runs = sorted((r.finished_at - r.started_at).total_seconds() for r in recent)
+
+    def summary(values):
+        if not values:
+            return {"count": 0}
+        return {
+            "count": len(values),
+            "mean": round(sum(values) / len(values), 3),
+            "p50": round(values[len(values) // 2], 3),
+            "p95": round(values[min(len(values) - 1, int(len(values) * 0.95))], 3),
+        }
+
+    return {
+        "depth": by_lane,
+        "oldest_queued_seconds": round((now - oldest).total_seconds(), 3) if oldest else 0.0,
+        "wait_seconds": summary(waits),
+        "processing_seconds": summary(runs),
+    }
@@ -0,0 +1,216 @@
+"""
+Image processing worker: runs jobs from the durable queue.
+
+    python -m app.tasks.worker --concurrency 4 --lanes high,default
+"""
+
+import argparse
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from prometheus_client import start_http_server
+
+from app.core.config import settings
+from app.core.metrics import JOB_SECONDS, JOBS_IN_PROGRESS
+from app.services import analysis
+from app.services.processing import (
+    mark_image_failed,
+    pending_batch_items,
+    run_image_batch_pipeline,
+    run_image_pipeline,
+    unfinished_image_ids,
+)
+from app.tasks import queue
+
+logger = logging.getLogger(__name__)
+
+
+def handle_process_image(job):
+    p = job.payload
+
+    # A job re-queued after its worker died may have finished already
+    if p["image_id"] not in unfinished_image_ids([p["image_id"]]):
+        logger.info("Image %s already processed; skipping job %s", p["image_id"], job.id)
+        return
+
+    try:
+        run_image_pipeline(
+            p["image_id"], p["s3_key"], p["occasion"], content_hash=p.get("content_hash")
+        )
+    except Exception:
+        if job.attempts >= job.max_attempts:
+            mark_image_failed(p["image_id"])
+        raise
+
+
+def handle_process_image_batch(job):
+    p = job.payload
+
+    # Retries only redo the images that did not finish last time
+    items = pending_batch_items(p["images"])
+    try:
+        run_image_batch_pipeline(items, p["occasion"])
+    except Exception:
+        if job.attempts >= job.max_attempts:
+            for it in pending_batch_items(items):
+                mark_image_failed(it["image_id"])
+        raise
+
+
+HANDLERS = {
+    "process_image": handle_process_image,
+    "process_image_batch": handle_process_image_batch,
+}
+
+
+def job_image_ids(job):
+    p = job.payload
+    if job.kind == "process_image_batch":
+        return [it["image_id"] for it in p["images"]]
+    return [p["image_id"]] if "image_id" in p else []
+
+
+def requeue_stale():
+    """
+    Re-queue jobs of dead workers; images of jobs given up are failed.
+    """
+    requeued, failed = queue.requeue_stale()
+    if requeued:
+        logger.warning("Re-queued %s job(s) of lost workers", requeued)
+    for job in failed:
+        logger.error("Job %s (%s) lost its worker on attempt %s/%s; giving up",
+                     job.id, job.kind, job.attempts, job.max_attempts)
+        for image_id in unfinished_image_ids(job_image_ids(job)):
+            mark_image_failed(image_id)
+
+
+class RunningJobs:
+    """
+    Ids of the jobs this process runs, for lease renewal.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = set()
+
+    def add(self, job_id: str):
+        with self._lock:
+            self._ids.add(job_id)
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._ids.discard(job_id)
+
+    def ids(self):
+        with self._lock:
+            return list(self._ids)
+
+
+running = RunningJobs()
+
+
+def heartbeat_loop(stop: threading.Event):
+    # Renew well within the lease so a slow batch is never taken twice
+    while not stop.wait(settings.JOB_LEASE_SECONDS / 4):
+        try:
+            queue.heartbeat(running.ids())
+        except Exception:
+            logger.exception("Renewing job leases failed")
+
+
+def run_job(job):
+    handler = HANDLERS.get(job.kind)
+    started = time.perf_counter()
+
+    try:
+        if handler is None:
+            raise LookupError(f"No handler for job kind {job.kind!r}")
+        with JOBS_IN_PROGRESS.labels(job.kind).track_inprogress():
+            handler(job)
+    except Exception as exc:
+        JOB_SECONDS.labels(job.kind, "failed").observe(time.perf_counter() - started)
+        retried = queue.fail(job.id, exc)
+        logger.warning(
+            "Job %s (%s) failed on attempt %s/%s%s: %s",
+            job.id, job.kind, job.attempts, job.max_attempts,
+            ", will retry" if retried else "", exc
+        )
+        return
+
+    elapsed = time.perf_counter() - started
+    JOB_SECONDS.labels(job.kind, "done").observe(elapsed)
+    queue.complete(job.id)
+    logger.info("Job %s (%s) done in %.3fs", job.id, job.kind, elapsed)
+
+
+def work_loop(worker_id: str, lanes, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            job = queue.claim(worker_id, lanes)
+        except Exception:
+            logger.exception("Claiming a job failed")
+            job = None
+
+        if job is None:
+            stop.wait(settings.JOB_POLL_INTERVAL)
+            continue
+
+        running.add(job.id)
+        try:
+            run_job(job)
+        finally:
+            running.discard(job.id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stylemate job worker")
+    parser.add_argument("--concurrency", type=int, default=settings.JOB_WORKER_CONCURRENCY)
+    parser.add_argument("--lanes", default=",".join(queue.LANES),
+                        help="comma-separated lanes to serve, e.g. high,default")
+    parser.add_argument("--metrics-port", type=int, default=settings.WORKER_METRICS_PORT,
+                        help="serve Prometheus metrics on this port (0 = off)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    lanes = [lane.strip() for lane in args.lanes.split(",") if lane.strip()]
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        logger.info("Stopping after current jobs...")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    if args.metrics_port:
+        start_http_server(args.metrics_port)
+
+    analysis.start()
+    requeue_stale()
+
+    threads = [
+        threading.Thread(target=work_loop, args=(f"{worker_id}/{i}", lanes, stop), daemon=True)
+        for i in range(args.concurrency)
+    ]
+    threads.append(threading.Thread(target=heartbeat_loop, args=(stop,), daemon=True))
+    for t in threads:
+        t.start()
+    logger.info("Worker %s serving lanes %s with concurrency %s", worker_id, lanes, args.concurrency)
+
+    while not stop.wait(settings.JOB_STATS_INTERVAL):
+        requeue_stale()
+        logger.info("Queue stats: %s", queue.stats())
+
+    for t in threads:
+        t.join()
+    analysis.shutdown()
+
+
+if __name__ == "__main__":
+    main()
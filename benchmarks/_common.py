@@ -0,0 +1,136 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Importing this module fills in any missing settings with local,
+network-free defaults (SQLite in a temp dir, dummy R2 credentials),
+so benchmarks can run without a .env file.
+
+Scripts that take --output write their results as JSON (see
+write_results); compare two such files with benchmarks.compare.
+"""
+
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+
+BENCH_DIR = tempfile.mkdtemp(prefix="stylemate-bench-")
+
+DEFAULT_ENV = {
+    "DATABASE_URL": f"sqlite:///{BENCH_DIR}/bench.db",
+    "S3_ENDPOINT_URL": "http://127.0.0.1:5000",
+    "S3_ACCESS_KEY": "bench",
+    "S3_SECRET_KEY": "bench",
+    "S3_BUCKET": "stylemate-bench",
+    "SECRET_KEY": "bench-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "IMAGE_RETENTION_HOURS": "24",
+    "MAX_IMAGE_SIZE_BYTES": "5242880",
+}
+
+for key, value in DEFAULT_ENV.items():
+    os.environ.setdefault(key, value)
+
+
+def measure(fn, repeat: int = 20, warmup: int = 1):
+    """
+    Run fn repeatedly and return latency stats in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return latency_stats(samples)
+
+
+def latency_stats(samples_ms: list):
+    """
+    Latency stats in milliseconds for a list of samples.
+    """
+    samples = sorted(samples_ms)
+    return {
+        "runs": len(samples),
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        "min_ms": samples[0],
+    }
+
+
+def git_revision():
+    """
+    Current commit (with a -dirty suffix for uncommitted changes), or None.
+    """
+    try:
+        rev = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return rev + ("-dirty" if dirty else "")
+
+
+def write_results(path: str, suite: str, results: dict, params: dict = None):
+    """
+    Write {metric name: stats} plus run metadata as JSON.
+    """
+    doc = {
+        "suite": suite,
+        "commit": git_revision(),
+        "timestamp": datetime.datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params or {},
+        "results": results,
+    }
+    with open(path, "w") as f:
+        json.dump(doc, f, indent=2, sort_keys=True)
+    print(f"Results written to {path}")
+
+
+def start_api(port: int):
+    """
+    Serve the API with uvicorn on a background thread.
+    Returns (server, thread); stop with server.should_exit = True + join.
+    """
+    import uvicorn
+
+    from app.core.config import settings
+    from app.main import app
+
+    # uvicorn 0.22 can drop a keep-alive connection whose next request
+    # arrived before the previous cycle finished; keep the timer above
+    # the longest long-poll so that never fires mid-request
+    server = uvicorn.Server(uvicorn.Config(
+        app, host="127.0.0.1", port=port, log_level="warning",
+        timeout_keep_alive=settings.LONG_POLL_MAX_WAIT + 5
+    ))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def print_row(name: str, stats: dict):
+    print(
+        f"{name:<40} mean={stats['mean_ms']:9.3f}ms  "
+        f"p50={stats['p50_ms']:9.3f}ms  p95={stats['p95_ms']:9.3f}ms"
+    )
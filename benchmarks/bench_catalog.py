@@ -0,0 +1,108 @@
+"""
+Compare the old full-table tag scan against the in-memory catalog index.
+
+    python -m benchmarks.bench_catalog --products 100000
+"""
+
+import argparse
+import random
+import time
+import uuid
+
+from benchmarks import _common  # noqa: F401  (sets default env)
+from benchmarks._common import measure, print_row
+
+from sqlmodel import SQLModel, select
+
+from app.db.session import engine, get_session_sync
+from app.db.models import Product
+from app.services.catalog import CatalogIndex
+from app.services.colors import color_to_lab
+
+
+CATEGORIES = ["top", "bottom", "shoes"]
+COLORS = ["white", "black", "navy", "beige", "olive", "rust", "charcoal", "burgundy"]
+WORDS = [
+    "structured", "shirt", "tailored", "blouse", "knit", "chinos", "trousers",
+    "skirt", "loafers", "sneakers", "flats", "jeans", "boots", "tee", "hoodie",
+    "kurta", "blazer", "overshirt", "joggers", "cargo", "pants", "office",
+    "casual", "party", "travel", "formal", "minimal", "slim", "relaxed", "ankle",
+]
+QUERIES = ["structured shirt", "ankle chinos", "loafers", "black jeans", "hoodie"]
+
+
+def legacy_fetch_products_by_tags(tags):
+    """
+    The original implementation: full table read + substring scan.
+    """
+    with get_session_sync() as session:
+        all_products = session.exec(select(Product)).all()
+
+    results = []
+    for p in all_products:
+        for tag in tags:
+            if tag.lower() in p.tags.lower():
+                results.append(p)
+                break
+    return results
+
+
+def seed(n: int):
+    SQLModel.metadata.drop_all(engine, tables=[Product.__table__])
+    SQLModel.metadata.create_all(engine, tables=[Product.__table__])
+
+    rng = random.Random(42)
+    rows = []
+    for i in range(n):
+        color = rng.choice(COLORS)
+        color_l, color_a, color_b = color_to_lab(color)
+        rows.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Product {i}",
+            "image_url": "https://example.com/p.jpg",
+            "price": rng.randint(500, 5000),
+            "category": rng.choice(CATEGORIES),
+            "color": color,
+            "color_l": color_l,
+            "color_a": color_a,
+            "color_b": color_b,
+            "tags": " ".join(rng.sample(WORDS, 4)),
+            "link": "#",
+        })
+    with engine.begin() as conn:
+        conn.execute(Product.__table__.insert(), rows)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--products", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Seeding {args.products} products...")
+    seed(args.products)
+
+    index = CatalogIndex(refresh_interval=3600)
+    start = time.perf_counter()
+    index.load_from_db()
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    start = time.perf_counter()
+    index.refresh()
+    print(f"Incremental refresh (no changes): {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    for q in QUERIES:
+        legacy = measure(lambda: legacy_fetch_products_by_tags([q]), repeat=args.repeat)
+        print_row(f"legacy scan    '{q}'", legacy)
+
+        cold = measure(lambda: (index._match_cache.clear(), index.match_any([q])), repeat=200)
+        print_row(f"index (uncached) '{q}'", cold)
+
+        warm = measure(lambda: index.match_any([q]), repeat=1000)
+        print_row(f"index (cached)   '{q}'", warm)
+
+        print(f"  speedup (uncached): {legacy['mean_ms'] / cold['mean_ms']:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Hot query latency with and without the secondary indexes.
+
+    python -m benchmarks.bench_db_indexes --rows 1000000
+
+Seeds users, images, recommendations and products (rows each) into a
+throwaway SQLite DB, times the hot lookups, then drops the secondary
+indexes and times the same lookups as full scans.
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from benchmarks import _common  # noqa: F401  (sets default env)
+from benchmarks._common import measure, print_row
+
+from sqlalchemy import text
+from sqlmodel import SQLModel, select
+
+from app.db.session import create_db_and_tables, engine, get_session_sync
+from app.db.models import Image, Product, Recommendation, User
+
+
+WORDS = [
+    "structured", "shirt", "tailored", "blouse", "knit", "chinos", "trousers",
+    "skirt", "loafers", "sneakers", "flats", "jeans", "boots", "tee", "hoodie",
+    "kurta", "blazer", "overshirt", "joggers", "cargo", "pants", "office",
+    "casual", "party", "travel", "formal", "minimal", "slim", "relaxed", "ankle",
+]
+
+
+def seed(rows: int, chunk: int = 50_000):
+    SQLModel.metadata.drop_all(engine)
+    create_db_and_tables()
+
+    rng = random.Random(7)
+    now = datetime.datetime.utcnow()
+
+    for start in range(0, rows, chunk):
+        ids = range(start, min(rows, start + chunk))
+        with engine.begin() as conn:
+            conn.execute(User.__table__.insert(), [
+                {"id": f"u{i}", "email": f"user{i}@example.com", "password_hash": "x",
+                 "created_at": now} for i in ids
+            ])
+            conn.execute(Image.__table__.insert(), [
+                {"id": f"i{i}", "user_id": f"u{i}", "s3_key": f"uploads/{i}.jpg",
+                 "uploaded_at": now - datetime.timedelta(minutes=rng.randint(0, 60 * 72)),
+                 "status": "processed"} for i in ids
+            ])
+            conn.execute(Recommendation.__table__.insert(), [
+                {"id": f"r{i}", "image_id": f"i{i}", "ranked_outfits": [], "created_at": now}
+                for i in ids
+            ])
+            conn.execute(Product.__table__.insert(), [
+                {"id": f"p{i}", "name": f"Product {i}", "image_url": "#", "price": 1000,
+                 "category": rng.choice(["top", "bottom", "shoes"]),
+                 "color": rng.choice(["white", "black", "navy", "beige", "olive"]),
+                 "tags": " ".join(rng.sample(WORDS, 4)) + f" sku{i}", "link": "#"}
+                for i in ids
+            ])
+        print(f"  seeded {min(rows, start + chunk)}/{rows}", end="\r")
+    print()
+
+
+def run_queries(rows: int, repeat: int, indexed: bool):
+    rng = random.Random(1)
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(hours=24)
+    suffix = "indexed" if indexed else "full scan"
+
+    def by_email():
+        with get_session_sync() as session:
+            stmt = select(User).where(User.email == f"user{rng.randrange(rows)}@example.com")
+            session.exec(stmt).one_or_none()
+
+    def by_image_id():
+        with get_session_sync() as session:
+            image_id = f"i{rng.randrange(rows)}"
+            stmt = select(Recommendation).where(Recommendation.image_id == image_id)
+            session.exec(stmt).one_or_none()
+
+    def cleanup_page():
+        with get_session_sync() as session:
+            stmt = (
+                select(Image.id, Image.s3_key, Image.uploaded_at)
+                .where(Image.uploaded_at < cutoff)
+                .order_by(Image.uploaded_at, Image.id)
+                .limit(1000)
+            )
+            session.exec(stmt).all()
+
+    def by_category_color():
+        with get_session_sync() as session:
+            stmt = (
+                select(Product.id)
+                .where(Product.category == "top", Product.color == "navy")
+                .limit(100)
+            )
+            session.exec(stmt).all()
+
+    print_row(f"User.email lookup ({suffix})", measure(by_email, repeat=repeat))
+    print_row(f"Recommendation.image_id ({suffix})", measure(by_image_id, repeat=repeat))
+    print_row(f"cleanup page of 1000 ({suffix})", measure(cleanup_page, repeat=repeat))
+    print_row(f"category+color ({suffix})", measure(by_category_color, repeat=repeat))
+
+
+def drop_secondary_indexes():
+    with engine.begin() as conn:
+        for table in SQLModel.metadata.sorted_tables:
+            for index in table.indexes:
+                conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--scan-repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Seeding {args.rows} rows per table...")
+    start = time.perf_counter()
+    seed(args.rows)
+    print(f"Seeded in {time.perf_counter() - start:.1f}s")
+
+    run_queries(args.rows, args.repeat, indexed=True)
+
+    drop_secondary_indexes()
+    run_queries(args.rows, args.scan_repeat, indexed=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+End-to-end load test: upload -> recommendation, under concurrency.
+
+    python -m benchmarks.bench_e2e --requests 200 --concurrency 16 --output results/e2e.json
+    python -m benchmarks.bench_e2e --mode inline --duplicates
+
+Starts a local moto S3 server, a throwaway SQLite DB and the API under
+uvicorn on localhost. In queue mode the jobs run in a separate
+`app.tasks.worker` process, as in production (--in-process-workers runs
+worker threads inside the API process instead). Each client uploads a
+photo, then long-polls its recommendation. Reports upload latency, time
+until the recommendation is ready, and throughput.
+"""
+
+import argparse
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+S3_PORT = int(os.environ.get("BENCH_S3_PORT", "5056"))
+API_PORT = int(os.environ.get("BENCH_API_PORT", "8765"))
+os.environ["S3_ENDPOINT_URL"] = f"http://127.0.0.1:{S3_PORT}"
+
+from benchmarks import _common  # noqa: E402,F401  (sets default env)
+from benchmarks._common import latency_stats, print_row, start_api, write_results  # noqa: E402
+from benchmarks.bench_pipeline import synthetic_photo  # noqa: E402
+
+import cv2  # noqa: E402
+import httpx  # noqa: E402
+from moto.server import ThreadedMotoServer  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.db.session import create_db_and_tables  # noqa: E402
+from app.seed_products import seed_products  # noqa: E402
+from app.services import storage  # noqa: E402
+
+
+def encoded_photos(n: int, resolution: str, duplicates: bool):
+    width, height = (int(v) for v in resolution.split("x"))
+    base = synthetic_photo(width, height)
+
+    photos = []
+    for i in range(1 if duplicates else n):
+        img = base.copy()
+        # A few changed pixels give every upload its own content hash
+        img[0, :8] = [(i >> (8 * k)) & 255 for k in range(3)]
+        ok, buf = cv2.imencode(".jpg", img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        photos.append(buf.tobytes())
+    return [photos[i % len(photos)] for i in range(n)]
+
+
+def start_workers(n: int):
+    from app.tasks.worker import work_loop
+
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=work_loop, args=(f"bench/{i}", None, stop), daemon=True)
+        for i in range(n)
+    ]
+    for t in threads:
+        t.start()
+
+    def shutdown():
+        stop.set()
+        for t in threads:
+            t.join()
+    return shutdown
+
+
+def start_worker_process(n: int):
+    """
+    A real `python -m app.tasks.worker` sharing the bench DB and S3
+    (settings are inherited through the environment).
+    """
+    proc = subprocess.Popen([sys.executable, "-m", "app.tasks.worker", "--concurrency", str(n)])
+
+    def shutdown():
+        proc.terminate()
+        proc.wait(timeout=60)
+    return shutdown
+
+
+def one_request(client, photo: bytes):
+    """
+    Returns (upload ms, upload -> recommendation ms).
+    """
+    start = time.perf_counter()
+    r = client.post(
+        "/api/v1/upload/",
+        files={"image": ("photo.jpg", photo, "image/jpeg")},
+        data={"occasion": "Office"}
+    )
+    r.raise_for_status()
+    uploaded = time.perf_counter()
+
+    image_id = r.json()["image_id"]
+    while True:
+        r = client.get(f"/api/v1/recommendations/{image_id}", params={"wait": 30})
+        if r.status_code == 200:
+            break
+        if r.json().get("detail") == "Image processing failed":
+            raise RuntimeError(f"processing failed for {image_id}")
+
+    done = time.perf_counter()
+    return (uploaded - start) * 1000, (done - start) * 1000
+
+
+def login(client):
+    """
+    Register + log in a bench user; returns auth headers.
+    """
+    creds = {"email": "bench@example.com", "password": "bench-password"}
+    client.post("/api/v1/auth/register", json=creds)
+    r = client.post("/api/v1/auth/login", json=creds)
+    r.raise_for_status()
+    return {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+
+def run_load(photos, concurrency: int):
+    limits = httpx.Limits(max_connections=concurrency)
+    with httpx.Client(base_url=f"http://127.0.0.1:{API_PORT}", timeout=60, limits=limits) as client:
+        client.headers.update(login(client))
+        one_request(client, photos[0])
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            samples = list(pool.map(lambda p: one_request(client, p), photos[1:]))
+        elapsed = time.perf_counter() - start
+
+    return samples, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mode", choices=["queue", "inline"], default="queue")
+    parser.add_argument("--workers", type=int, default=2, help="worker threads (queue mode)")
+    parser.add_argument("--in-process-workers", action="store_true",
+                        help="run queue workers as threads of the API process")
+    parser.add_argument("--resolution", default="1280x960")
+    parser.add_argument("--duplicates", action="store_true",
+                        help="upload the same photo every time (dedup path)")
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args()
+
+    settings.PROCESSING_MODE = args.mode
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+    # photos[0] warms up pools and caches before the timed run
+    photos = encoded_photos(args.requests + 1, args.resolution, args.duplicates)
+
+    s3 = ThreadedMotoServer(port=S3_PORT, verbose=False)
+    s3.start()
+    try:
+        storage.get_client().create_bucket(Bucket=settings.S3_BUCKET)
+        create_db_and_tables()
+        seed_products()
+
+        server, thread = start_api(API_PORT)
+        stop_workers = None
+        if args.mode == "queue":
+            start = start_workers if args.in_process_workers else start_worker_process
+            stop_workers = start(args.workers)
+
+        try:
+            samples, elapsed = run_load(photos, args.concurrency)
+        finally:
+            if stop_workers:
+                stop_workers()
+            server.should_exit = True
+            thread.join()
+    finally:
+        s3.stop()
+
+    results = {
+        "upload": latency_stats([s[0] for s in samples]),
+        "upload_to_recommendation": latency_stats([s[1] for s in samples]),
+        "throughput": {
+            "requests": len(samples),
+            "seconds": elapsed,
+            "per_second": len(samples) / elapsed,
+        },
+    }
+    print_row("upload", results["upload"])
+    print_row("upload -> recommendation", results["upload_to_recommendation"])
+    print(
+        f"throughput: {len(samples)} requests in {elapsed:.2f}s "
+        f"({results['throughput']['per_second']:.1f}/s at concurrency {args.concurrency})"
+    )
+
+    if args.output:
+        write_results(args.output, f"e2e-{args.mode}", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Full-resolution vs downscaled face detection on a fixture set.
+
+    python -m benchmarks.bench_face_detect --upscale 4000
+    python -m benchmarks.bench_face_detect --fixtures path/to/photos
+
+Reports the per-image speedup and, for the face picked by the fast
+path, the IoU with the closest full-resolution detection and whether
+the skin-tone bucket / hex colour sampled from both boxes agree.
+The default fixtures are the licensed photos in benchmarks/fixtures/faces
+(see the README there).
+"""
+
+import argparse
+import pathlib
+
+from benchmarks import _common  # noqa: F401  (sets default env)
+from benchmarks._common import measure
+
+import cv2
+
+from app.services.processing import analyze_image, detect_faces, extract_skin_tone_from_face
+
+
+EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+DEFAULT_FIXTURES = pathlib.Path(__file__).parent / "fixtures" / "faces"
+
+
+def iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+
+def hex_distance(a, b):
+    ca = [int(a[i:i + 2], 16) for i in (1, 3, 5)]
+    cb = [int(b[i:i + 2], 16) for i in (1, 3, 5)]
+    return max(abs(x - y) for x, y in zip(ca, cb))
+
+
+def load_fixture(path, upscale):
+    img = cv2.imread(str(path))
+    if img is None or not upscale:
+        return img
+    h, w = img.shape[:2]
+    scale = upscale / max(h, w)
+    return cv2.resize(img, (round(w * scale), round(h * scale)), interpolation=cv2.INTER_CUBIC)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixtures", default=str(DEFAULT_FIXTURES), help="directory of photos")
+    parser.add_argument("--upscale", type=int, default=4000,
+                        help="resize fixtures to this max side first (phone-sized); 0 = as-is")
+    parser.add_argument("--max-side", type=int, default=800)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    paths = sorted(
+        p for p in pathlib.Path(args.fixtures).iterdir() if p.suffix.lower() in EXTENSIONS
+    )
+    speedups, ious, tone_matches, compared = [], [], 0, 0
+
+    for path in paths:
+        img = load_fixture(path, args.upscale)
+        if img is None:
+            continue
+
+        full_faces = detect_faces(img, max_side=0)
+        fast = analyze_image(img, detect_max_side=args.max_side)
+
+        t_full = measure(lambda: analyze_image(img, detect_max_side=0), repeat=args.repeat)
+        t_fast = measure(lambda: analyze_image(img, detect_max_side=args.max_side), repeat=args.repeat)
+        speedup = t_full["mean_ms"] / t_fast["mean_ms"]
+        speedups.append(speedup)
+
+        line = (
+            f"{path.name:<28} {img.shape[1]}x{img.shape[0]}  "
+            f"full={t_full['mean_ms']:8.1f}ms  fast={t_fast['mean_ms']:7.1f}ms  x{speedup:5.1f}"
+        )
+
+        if full_faces and "face_bbox" in fast:
+            box = fast["face_bbox"]
+            box = (box["x"], box["y"], box["w"], box["h"])
+            match = max(full_faces, key=lambda f: iou(f, box))
+            box_iou = iou(match, box)
+            ious.append(box_iou)
+            compared += 1
+
+            full_tone = extract_skin_tone_from_face(img, match)
+            same_tone = full_tone["tone"] == fast["skin_tone"]["tone"]
+            tone_matches += same_tone
+            line += (
+                f"  iou={box_iou:.2f}  tone={'same' if same_tone else 'DIFF'}"
+                f"  hexΔ={hex_distance(full_tone['hex'], fast['skin_tone']['hex'])}"
+            )
+        else:
+            line += f"  faces: full={len(full_faces)} fast={int('face_bbox' in fast)}"
+
+        print(line)
+
+    if speedups:
+        print(f"\nmean speedup: x{sum(speedups) / len(speedups):.1f}")
+    if compared:
+        print(f"mean IoU: {sum(ious) / len(ious):.3f}  tone agreement: {tone_matches}/{compared}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Login load test: requests per second (and per hashing core) in a burst.
+
+    python -m benchmarks.bench_login --concurrency 32 --seconds 10
+
+Serves the API on localhost against a throwaway SQLite DB (no S3 needed),
+seeds users and drives /api/v1/auth/login from client threads with a mix
+of valid, wrong-password and unknown-email logins. Reports throughput,
+throughput per hashing worker, latency per kind, how many requests were
+shed with 503, and /health/live latency during the burst. Unknown-email
+and wrong-password latencies should match (constant-time negative path).
+"""
+
+import argparse
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+API_PORT = int(os.environ.get("BENCH_API_PORT", "8766"))
+
+from benchmarks import _common  # noqa: E402,F401  (sets default env)
+from benchmarks._common import latency_stats, print_row, start_api, write_results  # noqa: E402
+
+import httpx  # noqa: E402
+from passlib.hash import bcrypt  # noqa: E402
+
+from app.core import security  # noqa: E402
+from app.db.models import User  # noqa: E402
+from app.db.session import create_db_and_tables, engine  # noqa: E402
+
+PASSWORD = "correct horse battery staple"
+KINDS = ["valid", "wrong_password", "unknown_email"]
+
+
+def seed_users(n: int):
+    password_hash = bcrypt.hash(PASSWORD)
+    emails = [f"bench-{i}@example.com" for i in range(n)]
+    with engine.begin() as conn:
+        conn.execute(User.__table__.delete())
+        conn.execute(User.__table__.insert(), [
+            {"id": str(uuid.uuid4()), "email": e, "password_hash": password_hash}
+            for e in emails
+        ])
+    return emails
+
+
+def login_payload(kind: str, email: str, i: int):
+    if kind == "valid":
+        return {"email": email, "password": PASSWORD}
+    if kind == "wrong_password":
+        return {"email": email, "password": "nope"}
+    return {"email": f"nobody-{i}@example.com", "password": PASSWORD}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args()
+
+    create_db_and_tables()
+    emails = seed_users(args.users)
+    server, thread = start_api(API_PORT)
+
+    samples = defaultdict(list)  # kind -> [ms] of answered logins
+    statuses = Counter()
+    health = []
+    counter = itertools.count()
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.seconds
+
+    def client_loop(client):
+        while time.perf_counter() < deadline:
+            i = next(counter)
+            kind = KINDS[i % len(KINDS)]
+            start = time.perf_counter()
+            r = client.post(
+                "/api/v1/auth/login", json=login_payload(kind, emails[i % len(emails)], i)
+            )
+            elapsed = (time.perf_counter() - start) * 1000
+            with lock:
+                statuses[r.status_code] += 1
+                if r.status_code in (200, 401):
+                    samples[kind].append(elapsed)
+
+    def health_loop(client):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            client.get("/health/live")
+            health.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.05)
+
+    limits = httpx.Limits(max_connections=args.concurrency + 1)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{API_PORT}", timeout=60, limits=limits) as client:
+            client.post("/api/v1/auth/login", json=login_payload("unknown_email", "", -1))
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=client_loop, args=(client,)) for _ in range(args.concurrency)]
+            threads.append(threading.Thread(target=health_loop, args=(client,)))
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - started
+    finally:
+        server.should_exit = True
+        thread.join()
+
+    answered = sum(len(v) for v in samples.values())
+    workers = security.worker_count()
+    results = {
+        "throughput": {
+            "answered": answered,
+            "rejected_503": statuses.get(503, 0),
+            "seconds": elapsed,
+            "per_second": answered / elapsed,
+            "per_core_per_second": answered / elapsed / workers,
+        },
+        "health_live_during_burst": latency_stats(health),
+    }
+    for kind in KINDS:
+        if samples[kind]:
+            results[f"login_{kind}"] = latency_stats(samples[kind])
+            print_row(f"login {kind}", results[f"login_{kind}"])
+    print_row("/health/live during burst", results["health_live_during_burst"])
+    print(
+        f"logins: {answered} answered in {elapsed:.1f}s = {answered / elapsed:.1f}/s "
+        f"({answered / elapsed / workers:.1f}/s per hashing worker, {workers} workers), "
+        f"503s: {statuses.get(503, 0)}"
+    )
+
+    if args.output:
+        write_results(args.output, "login", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
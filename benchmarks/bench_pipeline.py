@@ -0,0 +1,124 @@
+"""
+Micro-benchmarks for the processing and recommendation hot paths.
+
+    python -m benchmarks.bench_pipeline --output results/pipeline.json
+    python -m benchmarks.bench_pipeline --fixture photo.jpg --sizes 1000,10000
+
+Measures process_downloaded_image per resolution, extract_skin_tone_from_face,
+fetch_products_by_tags across catalog sizes and map_templates_to_products.
+Runs against a throwaway SQLite DB; no network needed.
+"""
+
+import argparse
+import os
+
+from benchmarks import _common  # noqa: F401  (sets default env)
+from benchmarks._common import BENCH_DIR, measure, print_row, write_results
+from benchmarks.bench_catalog import QUERIES, seed
+
+import cv2
+import numpy as np
+
+from app.services.catalog import catalog
+from app.services.processing import extract_skin_tone_from_face, process_downloaded_image
+from app.services.recommender import fetch_products_by_tags, map_templates_to_products
+from app.services.rules_engine import generate_recommendations_for_features
+
+
+RESOLUTIONS = "640x480,1280x960,1920x1440,4032x3024"
+CATALOG_SIZES = "1000,10000,100000"
+
+
+def synthetic_photo(width: int, height: int):
+    """
+    Deterministic stand-in for a portrait: gradient background, noise
+    and a skin-coloured face ellipse.
+    """
+    rng = np.random.default_rng(0)
+    ramp = np.linspace(40, 200, width, dtype=np.float32)
+    img = np.repeat(ramp[None, :, None], height, axis=0).repeat(3, axis=2)
+    img += rng.normal(0, 12, img.shape)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+
+    center = (width // 2, height // 3)
+    axes = (width // 10, height // 7)
+    cv2.ellipse(img, center, axes, 0, 0, 360, (120, 160, 205), -1)
+    return img
+
+
+def photo_at(base, width: int, height: int):
+    if base is None:
+        return synthetic_photo(width, height)
+    return cv2.resize(base, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def bench_images(base, resolutions, repeat, results):
+    for res in resolutions:
+        width, height = (int(v) for v in res.split("x"))
+        img = photo_at(base, width, height)
+
+        path = os.path.join(BENCH_DIR, f"photo-{res}.jpg")
+        cv2.imwrite(path, img, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+        name = f"process_downloaded_image[{res}]"
+        results[name] = measure(lambda: process_downloaded_image(path), repeat=repeat)
+        print_row(name, results[name])
+
+        # Central face-sized box, as the detector would return it
+        side = min(width, height) // 4
+        face = (width // 2 - side // 2, height // 3 - side // 2, side, side)
+        name = f"extract_skin_tone_from_face[{res}]"
+        results[name] = measure(
+            lambda: extract_skin_tone_from_face(img, face), repeat=repeat * 10
+        )
+        print_row(name, results[name])
+
+
+def bench_catalog(sizes, repeat, results):
+    templates = generate_recommendations_for_features(
+        {"skin_tone": {"tone": "medium"}}, "Office"
+    )
+
+    for n in sizes:
+        seed(n)
+        catalog.load_from_db()
+
+        for q in QUERIES:
+            name = f"fetch_products_by_tags[{n}]['{q}']"
+            results[name] = measure(
+                lambda: (catalog._match_cache.clear(), fetch_products_by_tags([q])),
+                repeat=repeat
+            )
+            print_row(name, results[name])
+
+        name = f"map_templates_to_products[{n}]"
+        results[name] = measure(
+            lambda: (catalog._match_cache.clear(), map_templates_to_products(templates)),
+            repeat=repeat
+        )
+        print_row(name, results[name])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fixture", help="photo to resize to each resolution (default: synthetic)")
+    parser.add_argument("--resolutions", default=RESOLUTIONS)
+    parser.add_argument("--sizes", default=CATALOG_SIZES, help="catalog sizes to seed")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args()
+
+    base = cv2.imread(args.fixture) if args.fixture else None
+    resolutions = args.resolutions.split(",")
+    sizes = [int(n) for n in args.sizes.split(",")]
+
+    results = {}
+    bench_images(base, resolutions, args.repeat, results)
+    bench_catalog(sizes, args.repeat * 5, results)
+
+    if args.output:
+        write_results(args.output, "pipeline", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
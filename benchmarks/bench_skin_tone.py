@@ -0,0 +1,103 @@
+"""
+Per-face skin-tone extraction (the old loop) vs the batched extractor.
+
+    python -m benchmarks.bench_skin_tone --faces 1,8,32 --resolution 1920x1440
+
+Also checks that without trimming / sampling the batched results match
+the old per-face mean, and how both react to a specular highlight.
+"""
+
+import argparse
+
+from benchmarks import _common  # noqa: F401  (sets default env)
+from benchmarks._common import measure, print_row, write_results
+from benchmarks.bench_pipeline import synthetic_photo
+
+import cv2
+import numpy as np
+
+from app.services.processing import (
+    bgr_to_hex,
+    extract_skin_tones,
+    extract_skin_tones_many,
+    tone_bucket,
+)
+
+
+def legacy_extract_skin_tone_from_face(img_bgr, face_box):
+    """
+    The original implementation: one cvtColor + reductions per face.
+    """
+    x, y, w, h = face_box
+    roi = img_bgr[y + int(h * 0.2):y + int(h * 0.8), x + int(w * 0.2):x + int(w * 0.8)]
+    if roi.size == 0:
+        return {"tone": "unknown", "hex": "#808080"}
+    lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
+    mean_light = np.mean(lab[:, :, 0])
+    return {"tone": tone_bucket(mean_light), "hex": bgr_to_hex(roi.mean(axis=(0, 1)))}
+
+
+def face_grid(width: int, height: int, n: int):
+    """
+    n face boxes laid out on a grid, like a group photo.
+    """
+    cols = int(np.ceil(np.sqrt(n)))
+    rows = int(np.ceil(n / cols))
+    side = min(width // cols, height // rows) * 3 // 4
+    return [
+        ((k % cols) * (width // cols), (k // cols) * (height // rows), side, side)
+        for k in range(n)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--faces", default="1,8,32")
+    parser.add_argument("--resolution", default="1920x1440")
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--output", help="write JSON results here")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.split("x"))
+    img = synthetic_photo(width, height)
+    results = {}
+
+    for n in (int(v) for v in args.faces.split(",")):
+        boxes = face_grid(width, height, n)
+
+        name = f"skin_tone per-face loop[{n} faces]"
+        results[name] = measure(
+            lambda: [legacy_extract_skin_tone_from_face(img, b) for b in boxes], repeat=args.repeat
+        )
+        print_row(name, results[name])
+
+        name = f"skin_tone batched[{n} faces]"
+        results[name] = measure(lambda: extract_skin_tones(img, boxes), repeat=args.repeat)
+        print_row(name, results[name])
+
+        # trim=0 is the plain mean: same buckets, hex within rounding
+        legacy = [legacy_extract_skin_tone_from_face(img, b) for b in boxes]
+        batched = extract_skin_tones_many([(img, boxes)], trim=0, max_pixels=0)[0]
+        same = sum(a["tone"] == b["tone"] for a, b in zip(legacy, batched))
+        print(f"  trim=0 agreement with the old extractor: {same}/{n} tones")
+
+    # Robustness: a specular highlight over 8% of a uniform mid-tone face
+    face = (width // 4, height // 4, width // 4, width // 4)
+    x, y, w, h = face
+    patch = img.copy()
+    patch[y:y + h, x:x + w] = (70, 110, 150)
+    before = legacy_extract_skin_tone_from_face(patch, face)
+    patch[y + int(h * 0.3):y + int(h * 0.36), x + int(w * 0.26):x + int(w * 0.74)] = 255
+    after_legacy = legacy_extract_skin_tone_from_face(patch, face)
+    after_batched = extract_skin_tones(patch, [face])[0]
+    print(
+        f"highlight: old {before['tone']} -> {after_legacy['tone']} {after_legacy['hex']}, "
+        f"batched {after_batched['tone']} {after_batched['hex']} {after_batched['lightness']}"
+    )
+
+    if args.output:
+        write_results(args.output, "skin_tone", results, vars(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Storage load test against a local moto S3 server (no network needed).
+
+    python -m benchmarks.bench_storage --requests 500 --concurrency 32
+
+Compares a fresh boto3 client per call (the old processing path) with
+the shared pooled client, then drives the async API concurrently.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from moto.server import ThreadedMotoServer
+
+PORT = int(os.environ.get("BENCH_S3_PORT", "5055"))
+os.environ["S3_ENDPOINT_URL"] = f"http://127.0.0.1:{PORT}"
+
+from benchmarks import _common  # noqa: E402,F401  (sets default env)
+from benchmarks._common import measure, print_row  # noqa: E402
+
+import boto3  # noqa: E402
+from botocore.client import Config  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.services import storage  # noqa: E402
+
+
+PAYLOAD = os.urandom(200 * 1024)
+
+
+def fresh_client_download(key):
+    s3 = boto3.client(
+        "s3",
+        endpoint_url=settings.S3_ENDPOINT_URL,
+        aws_access_key_id=settings.S3_ACCESS_KEY,
+        aws_secret_access_key=settings.S3_SECRET_KEY,
+        config=Config(signature_version="s3v4")
+    )
+    return s3.get_object(Bucket=settings.S3_BUCKET, Key=key)["Body"].read()
+
+
+async def async_load(n, concurrency):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            key = f"bench/async-{i}.jpg"
+            await storage.upload_bytes_async(key, PAYLOAD)
+            await storage.download_bytes_async(key)
+            await storage.delete_object_async(key)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    server = ThreadedMotoServer(port=PORT, verbose=False)
+    server.start()
+    try:
+        storage.get_client().create_bucket(Bucket=settings.S3_BUCKET)
+        storage.upload_bytes("bench/sample.jpg", PAYLOAD)
+
+        print_row("download, new client per call",
+                  measure(lambda: fresh_client_download("bench/sample.jpg"), repeat=args.repeat))
+        print_row("download, shared pooled client",
+                  measure(lambda: storage.download_bytes("bench/sample.jpg"), repeat=args.repeat))
+
+        elapsed = asyncio.run(async_load(args.requests, args.concurrency))
+        print(
+            f"async upload+download+delete: {args.requests} objects in {elapsed:.2f}s "
+            f"({args.requests / elapsed:.1f} objects/s at concurrency {args.concurrency})"
+        )
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
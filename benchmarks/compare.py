@@ -0,0 +1,75 @@
+"""
+Compare two benchmark result files (written with --output).
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 10
+
+Prints the change of every shared metric. *_ms values are better when
+lower, per_second values when higher. Exits with status 1 if any metric
+regressed by more than --threshold percent, so it can gate CI.
+"""
+
+import argparse
+import json
+import sys
+
+
+# stat -> True if higher is better
+COMPARED = {
+    "mean_ms": False,
+    "p50_ms": False,
+    "p95_ms": False,
+    "per_second": True,
+}
+
+
+def load(path: str):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(baseline: dict, candidate: dict, threshold: float):
+    """
+    Yields (metric, stat, old, new, change %, regressed).
+    """
+    for name in sorted(set(baseline["results"]) & set(candidate["results"])):
+        old_stats = baseline["results"][name]
+        new_stats = candidate["results"][name]
+        for stat, higher_is_better in COMPARED.items():
+            if stat not in old_stats or stat not in new_stats:
+                continue
+            old, new = old_stats[stat], new_stats[stat]
+            change = (new - old) / old * 100 if old else 0.0
+            worse = -change if higher_is_better else change
+            yield name, stat, old, new, change, worse > threshold
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    baseline, candidate = load(args.baseline), load(args.candidate)
+    if baseline.get("suite") != candidate.get("suite"):
+        print(f"warning: comparing suite {baseline.get('suite')} with {candidate.get('suite')}")
+    print(f"baseline  {baseline.get('commit')}  {baseline.get('timestamp')}")
+    print(f"candidate {candidate.get('commit')}  {candidate.get('timestamp')}\n")
+
+    regressions = 0
+    for name, stat, old, new, change, regressed in compare(baseline, candidate, args.threshold):
+        regressions += regressed
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name:<50} {stat:<10} {old:12.3f} -> {new:12.3f}  {change:+7.1f}%{flag}")
+
+    missing = set(baseline["results"]) ^ set(candidate["results"])
+    if missing:
+        print(f"\nnot in both files: {', '.join(sorted(missing))}")
+
+    print(f"\n{regressions} regression(s) above {args.threshold:g}%")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
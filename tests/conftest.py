@@ -0,0 +1,40 @@
+"""
+Test settings: a throwaway SQLite database and dummy R2 credentials, set
+before any app module reads them (the same defaults as the benchmarks).
+"""
+
+import os
+import tempfile
+
+TEST_DIR = tempfile.mkdtemp(prefix="stylemate-test-")
+
+TEST_ENV = {
+    "DATABASE_URL": f"sqlite:///{TEST_DIR}/test.db",
+    "S3_ENDPOINT_URL": "http://127.0.0.1:5000",
+    "S3_ACCESS_KEY": "test",
+    "S3_SECRET_KEY": "test",
+    "S3_BUCKET": "stylemate-test",
+    "SECRET_KEY": "test-secret",
+    "ALGORITHM": "HS256",
+    "ACCESS_TOKEN_EXPIRE_MINUTES": "60",
+    "IMAGE_RETENTION_HOURS": "24",
+    "MAX_IMAGE_SIZE_BYTES": "5242880",
+}
+
+for key, value in TEST_ENV.items():
+    os.environ[key] = value
+
+import pytest  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from app.db.session import create_db_and_tables, engine  # noqa: E402
+
+
+@pytest.fixture
+def db():
+    """
+    Fresh, empty tables for each test.
+    """
+    SQLModel.metadata.drop_all(engine)
+    create_db_and_tables()
+    yield engine
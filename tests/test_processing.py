@@ -0,0 +1,101 @@
+import datetime
+
+import cv2
+import numpy as np
+import pytest
+from sqlmodel import Session
+
+from app.db.models import Image, Recommendation
+from app.services.processing import (
+    bgr_to_hex,
+    extract_skin_tones_many,
+    pending_batch_items,
+    tone_bucket,
+    unfinished_image_ids,
+)
+
+
+def legacy_skin_tone(img_bgr, face_box):
+    """
+    The per-face implementation extract_skin_tones_many replaced.
+    """
+    x, y, w, h = face_box
+    roi = img_bgr[y + int(h * 0.2):y + int(h * 0.8), x + int(w * 0.2):x + int(w * 0.8)]
+    if roi.size == 0:
+        return {"tone": "unknown", "hex": "#808080"}
+    lab = cv2.cvtColor(roi, cv2.COLOR_BGR2LAB)
+    mean_light = float(np.mean(lab[:, :, 0]))
+    return {
+        "tone": tone_bucket(mean_light),
+        "hex": bgr_to_hex(roi.mean(axis=(0, 1))),
+        "mean": mean_light,
+    }
+
+
+@pytest.fixture
+def photos():
+    rng = np.random.default_rng(7)
+    noise = rng.integers(0, 256, size=(480, 640, 3), dtype=np.uint8)
+    # Smooth patches in every tone bucket, so all of them are covered
+    flat = np.zeros((300, 400, 3), dtype=np.uint8)
+    for k, value in enumerate((40, 120, 170, 230)):
+        flat[:, k * 100:(k + 1) * 100] = (value, value - 20 if value > 20 else 0, value)
+    boxes_noise = [(0, 0, 200, 200), (300, 100, 120, 260), (630, 470, 4, 4)]
+    boxes_flat = [(k * 100, 50, 100, 200) for k in range(4)]
+    return [(noise, boxes_noise), (flat, boxes_flat)]
+
+
+def test_untrimmed_batch_matches_legacy_mean(photos):
+    batched = extract_skin_tones_many(photos, trim=0, max_pixels=0)
+
+    for (img, boxes), results in zip(photos, batched):
+        assert len(results) == len(boxes)
+        for box, result in zip(boxes, results):
+            legacy = legacy_skin_tone(img, box)
+            assert result["tone"] == legacy["tone"]
+            assert result["hex"] == legacy["hex"]
+            if "mean" in legacy:
+                assert result["lightness"]["mean"] == round(legacy["mean"], 1)
+                assert result["lightness"]["trimmed_mean"] == round(legacy["mean"], 1)
+
+
+def test_trim_ignores_a_highlight():
+    face = np.full((200, 200, 3), 110, dtype=np.uint8)
+    box = (0, 0, 200, 200)
+    # Specular highlight over ~7% of the sampled region (trim is 10%)
+    face[40:48, 40:160] = 255
+
+    untrimmed = extract_skin_tones_many([(face, [box])], trim=0, max_pixels=0)[0][0]
+    trimmed = extract_skin_tones_many([(face, [box])], trim=0.1, max_pixels=0)[0][0]
+    assert untrimmed["lightness"]["mean"] > trimmed["lightness"]["trimmed_mean"]
+    assert trimmed["lightness"]["trimmed_mean"] == trimmed["lightness"]["median"]
+
+
+def add_images(engine):
+    now = datetime.datetime.utcnow()
+    with Session(engine) as session:
+        for image_id, status in (("new", "pending"), ("done", "processed"),
+                                 ("broken", "failed"), ("stored", "pending")):
+            session.add(Image(id=image_id, s3_key=image_id, uploaded_at=now, status=status))
+        # "stored": the worker died after committing the recommendation
+        for image_id in ("done", "stored"):
+            session.add(Recommendation(id=f"rec-{image_id}", image_id=image_id, ranked_outfits=[]))
+        session.commit()
+
+
+def test_unfinished_image_ids(db):
+    add_images(db)
+    assert unfinished_image_ids(["new", "done", "broken", "stored", "unknown"]) == {"new"}
+    assert unfinished_image_ids([]) == set()
+
+
+def test_pending_batch_items_keeps_order(db):
+    add_images(db)
+    now = datetime.datetime.utcnow()
+    with Session(db) as session:
+        session.add(Image(id="new-2", s3_key="new-2", uploaded_at=now, status="pending"))
+        session.commit()
+
+    items = [{"image_id": image_id, "s3_key": image_id}
+             for image_id in ("new-2", "done", "new", "broken", "stored")]
+    assert [it["image_id"] for it in pending_batch_items(items)] == ["new-2", "new"]
@@ -0,0 +1,133 @@
+import datetime
+import threading
+
+import pytest
+from sqlmodel import Session
+
+from app.core.config import settings
+from app.db.models import Image, Job
+from app.tasks import queue, worker
+
+
+def get_job(engine, job_id: str):
+    with Session(engine) as session:
+        return session.get(Job, job_id)
+
+
+def make_runnable(engine, job_id: str, **values):
+    """
+    Move a job's timestamps into the past (backoff over / lease expired).
+    """
+    past = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    with Session(engine) as session:
+        job = session.get(Job, job_id)
+        job.run_after = past
+        for key, value in values.items():
+            setattr(job, key, past if value == "past" else value)
+        session.add(job)
+        session.commit()
+
+
+def test_claim_takes_by_lane_priority(db):
+    bulk = queue.enqueue("process_image", {"n": 1}, lane="bulk")
+    high = queue.enqueue("process_image", {"n": 2}, lane="high")
+
+    assert queue.claim("w1").id == high
+    assert queue.claim("w1", lanes=["default"]) is None
+    assert queue.claim("w1").id == bulk
+    assert queue.claim("w1") is None
+
+
+def test_two_workers_racing_claim_one_job_once(db):
+    for _ in range(10):
+        job_id = queue.enqueue("process_image", {})
+        barrier = threading.Barrier(2)
+        claimed = []
+
+        def race(worker_id):
+            barrier.wait()
+            claimed.append(queue.claim(worker_id))
+
+        threads = [threading.Thread(target=race, args=(f"w{i}",)) for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        winners = [job for job in claimed if job is not None]
+        assert [job.id for job in winners] == [job_id]
+        job = get_job(db, job_id)
+        assert job.status == "running"
+        assert job.attempts == 1
+        assert job.locked_by == winners[0].locked_by
+        queue.complete(job_id)
+
+
+def test_fail_backs_off_then_gives_up(db, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 10)
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_MAX", 300)
+    job_id = queue.enqueue("process_image", {}, max_attempts=3)
+
+    for attempt, base_delay in ((1, 10), (2, 20)):
+        assert queue.claim("w1").attempts == attempt
+        before = datetime.datetime.utcnow()
+        assert queue.fail(job_id, RuntimeError("boom")) is True
+
+        job = get_job(db, job_id)
+        assert job.status == "queued"
+        assert job.locked_by is None
+        assert job.last_error == "RuntimeError: boom"
+        delay = (job.run_after - before).total_seconds()
+        assert base_delay * 0.8 - 1 <= delay <= base_delay * 1.2 + 1
+
+        # Not runnable again until the backoff is over
+        assert queue.claim("w1") is None
+        make_runnable(db, job_id)
+
+    assert queue.claim("w1").attempts == 3
+    assert queue.fail(job_id, ValueError("still broken")) is False
+    job = get_job(db, job_id)
+    assert job.status == "failed"
+    assert job.finished_at is not None
+    assert job.last_error == "ValueError: still broken"
+    assert queue.claim("w1") is None
+
+
+def test_retry_delay_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF", 5)
+    monkeypatch.setattr(settings, "JOB_RETRY_BACKOFF_MAX", 60)
+    assert all(queue.retry_delay(attempts) <= 60 * 1.2 for attempts in range(1, 30))
+
+
+def test_stale_jobs_are_requeued_until_out_of_attempts(db):
+    with Session(db) as session:
+        session.add(Image(
+            id="img-1", s3_key="k", uploaded_at=datetime.datetime.utcnow(), status="pending"
+        ))
+        session.commit()
+    job_id = queue.enqueue("process_image", {"image_id": "img-1"}, max_attempts=2)
+
+    queue.claim("w1")
+    make_runnable(db, job_id, started_at="past", heartbeat_at="past")
+    assert queue.requeue_stale() == (1, [])
+    assert get_job(db, job_id).status == "queued"
+
+    # A renewed lease keeps the job running
+    queue.claim("w1")
+    make_runnable(db, job_id, started_at="past", heartbeat_at="past")
+    queue.heartbeat([job_id])
+    assert queue.requeue_stale() == (0, [])
+
+    make_runnable(db, job_id, heartbeat_at="past")
+    worker.requeue_stale()
+    job = get_job(db, job_id)
+    assert job.status == "failed"
+    assert job.attempts == 2
+    with Session(db) as session:
+        assert session.get(Image, "img-1").status == "failed"
+
+
+@pytest.mark.parametrize("lane", ["urgent", ""])
+def test_unknown_lane_is_rejected(lane):
+    with pytest.raises(ValueError):
+        queue.new_job("process_image", {}, lane=lane)
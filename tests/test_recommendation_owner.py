@@ -0,0 +1,66 @@
+import asyncio
+import datetime
+
+import pytest
+from fastapi import HTTPException
+from sqlmodel import Session, delete
+
+from app.api.v1.recommendations import _authorize
+from app.db.models import Image, Recommendation
+from app.services import results
+
+
+@pytest.fixture(autouse=True)
+def empty_owner_cache():
+    results.owner_cache.clear()
+    yield
+    results.owner_cache.clear()
+
+
+def add_image(engine, image_id: str, user_id: str, with_recommendation: bool = True):
+    with Session(engine) as session:
+        session.add(Image(
+            id=image_id, user_id=user_id, s3_key=f"uploads/{image_id}",
+            uploaded_at=datetime.datetime.utcnow(), status="processed"
+        ))
+        if with_recommendation:
+            session.add(Recommendation(
+                id=f"rec-{image_id}", image_id=image_id, user_id=user_id, ranked_outfits=[]
+            ))
+        session.commit()
+
+
+def authorized(image_id: str, user_id: str):
+    try:
+        asyncio.run(_authorize(image_id, user_id))
+    except HTTPException as exc:
+        assert exc.status_code == 404
+        return False
+    return True
+
+
+def test_only_the_owner_is_authorized(db):
+    add_image(db, "img-1", "alice")
+
+    assert authorized("img-1", "alice")
+    assert not authorized("img-1", "bob")
+    assert not authorized("missing", "alice")
+
+
+def test_owner_keeps_access_after_image_cleanup(db):
+    add_image(db, "img-1", "alice")
+    with Session(db) as session:
+        # What cleanup_expired_images does once the retention window ends
+        session.exec(delete(Image).where(Image.id == "img-1"))
+        session.commit()
+
+    assert authorized("img-1", "alice")
+    results.owner_cache.clear()
+    assert not authorized("img-1", "bob")
+
+
+def test_pending_image_is_authorized_by_its_row(db):
+    add_image(db, "img-1", "alice", with_recommendation=False)
+
+    assert authorized("img-1", "alice")
+    assert not authorized("img-1", "bob")
@@ -0,0 +1,33 @@
+import json
+
+from app.services.rules_engine import DEFAULT_RULES_FILE, compile_rules
+
+
+def bundled_rules():
+    with open(DEFAULT_RULES_FILE) as f:
+        return json.load(f)
+
+
+def test_bundled_rules_key_templates_by_tone_and_occasion_only():
+    rules = compile_rules(json.dumps(bundled_rules()).encode())
+
+    assert len(rules.templates) == len(rules.palettes) * len(rules.occasions)
+    assert rules.proportion_bucket({"image_ratio": 2.0}) == rules.default_proportion
+
+
+def test_buckets_without_preferences_are_ignored():
+    raw = bundled_rules()
+    raw["proportions"] = [
+        {"name": "full_length", "min_ratio": 1.6, "prefer": {"shoes": ["formal flats"]}},
+        {"name": "close_up", "min_ratio": 0, "prefer": {}},
+    ]
+    rules = compile_rules(json.dumps(raw).encode())
+
+    assert rules.proportion_bucket({"image_ratio": 2.0}) == "full_length"
+    assert rules.proportion_bucket({"image_ratio": 1.0}) == rules.default_proportion
+    assert len(rules.templates) == 2 * len(rules.palettes) * len(rules.occasions)
+
+    full = rules.templates[rules.resolve("medium", "Office", "full_length")]
+    default = rules.templates[rules.resolve("medium", "Office", "unknown")]
+    assert full[0]["shoes"] == "formal flats"
+    assert full != default
@@ -0,0 +1,67 @@
+import time
+
+import pytest
+from jose import jwt
+
+from app.core import security
+from app.core.config import settings
+from app.core.security import InvalidToken, create_access_token, verify_access_token
+
+
+@pytest.fixture(autouse=True)
+def empty_token_cache():
+    security.token_cache.clear()
+    yield
+    security.token_cache.clear()
+
+
+def test_valid_token_returns_its_user():
+    token, expires_in = create_access_token("user-1")
+    assert verify_access_token(token) == "user-1"
+    assert expires_in == 60 * settings.ACCESS_TOKEN_EXPIRE_MINUTES
+
+
+def test_expired_token_is_rejected():
+    token = jwt.encode(
+        {"sub": "user-1", "type": "access", "exp": int(time.time()) - 10},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    with pytest.raises(InvalidToken):
+        verify_access_token(token)
+
+
+def test_bad_signature_and_wrong_type_are_rejected():
+    forged = jwt.encode(
+        {"sub": "user-1", "type": "access", "exp": int(time.time()) + 60},
+        "not-the-secret", algorithm=settings.ALGORITHM
+    )
+    with pytest.raises(InvalidToken):
+        verify_access_token(forged)
+
+    refresh = jwt.encode(
+        {"sub": "user-1", "type": "refresh", "exp": int(time.time()) + 60},
+        settings.SECRET_KEY, algorithm=settings.ALGORITHM
+    )
+    with pytest.raises(InvalidToken):
+        verify_access_token(refresh)
+
+
+def test_verified_tokens_skip_the_signature_check(monkeypatch):
+    token, _ = create_access_token("user-1")
+    verify_access_token(token)
+
+    def no_decode(*args, **kwargs):
+        raise AssertionError("token was decoded again")
+
+    monkeypatch.setattr(security.jwt, "decode", no_decode)
+    assert verify_access_token(token) == "user-1"
+
+
+def test_cached_token_still_expires(monkeypatch):
+    token, _ = create_access_token("user-1", expires_minutes=1)
+    verify_access_token(token)
+
+    later = time.time() + 120
+    monkeypatch.setattr(security.time, "time", lambda: later)
+    with pytest.raises(InvalidToken):
+        verify_access_token(token)